@@ -0,0 +1,248 @@
+"""
+過去のコンテスト告知のアーカイブ（SQLite + FTS5）と、その埋め戻し。
+
+- Archive: 告知を 1 投稿 1 行で持ち、タイトル・本文・スラッグ・シリーズを全文検索する。
+  日本語は単語の区切りが無いので trigram で索引を作る（2 文字以下の語だけは LIKE で探す）
+- Backfill: 投稿 ID（連番）を新しい方から下りながら取得し、コンテスト告知をアーカイブに入れる。
+  同時取得数と 1 秒あたりの取得数を抑え、進み具合を状態 DB に残して次回はそこから再開する
+"""
+
+import asyncio
+import time
+
+from metrics import registry
+from records import Post
+from state_store import connect
+
+ARCHIVE_SEARCH_SECONDS = registry.histogram(
+    "archive_search_seconds", "アーカイブの検索時間"
+)
+BACKFILL_POSTS = registry.counter(
+    "archive_backfill_total",
+    "埋め戻しで調べた投稿（result=archived: 告知 / skipped: 告知以外・登録済み / missing: 存在しない）",
+)
+
+# 検索結果の抜粋の長さ（trigram なのでおおよそ文字数）
+_SNIPPET_TOKENS = 24
+
+
+class Archive:
+    """
+    archive_posts に Post を投稿 ID で 1 行ずつ持ち、archive_fts（external content の FTS5）を
+    トリガで同期させる。本文を後から変換した投稿は add() し直せば差し替わる（本文なしでは上書きしない）。
+    """
+
+    def __init__(self, path):
+        self._db = connect(path)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS archive_posts (
+                post_id INTEGER PRIMARY KEY,
+                post_url TEXT NOT NULL,
+                title TEXT NOT NULL,
+                slugs TEXT NOT NULL,
+                series TEXT NOT NULL,
+                contest_url TEXT,
+                text TEXT
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS archive_fts USING fts5(
+                title, text, slugs, series,
+                content='archive_posts', content_rowid='post_id', tokenize='trigram'
+            );
+            CREATE TRIGGER IF NOT EXISTS archive_posts_ai AFTER INSERT ON archive_posts
+            BEGIN
+                INSERT INTO archive_fts (rowid, title, text, slugs, series)
+                VALUES (new.post_id, new.title, new.text, new.slugs, new.series);
+            END;
+            CREATE TRIGGER IF NOT EXISTS archive_posts_ad AFTER DELETE ON archive_posts
+            BEGIN
+                INSERT INTO archive_fts (archive_fts, rowid, title, text, slugs, series)
+                VALUES ('delete', old.post_id, old.title, old.text, old.slugs, old.series);
+            END;
+            CREATE TRIGGER IF NOT EXISTS archive_posts_au AFTER UPDATE ON archive_posts
+            BEGIN
+                INSERT INTO archive_fts (archive_fts, rowid, title, text, slugs, series)
+                VALUES ('delete', old.post_id, old.title, old.text, old.slugs, old.series);
+                INSERT INTO archive_fts (rowid, title, text, slugs, series)
+                VALUES (new.post_id, new.title, new.text, new.slugs, new.series);
+            END;
+            """)
+        self._db.commit()
+
+    def add(self, post: Post) -> bool:
+        """コンテスト告知を登録する。告知でない・ID が数値でない投稿は入れずに False を返す。"""
+        if not post.is_contest or not post.post_id.isdigit():
+            return False
+        self._db.execute(
+            "INSERT INTO archive_posts "
+            "(post_id, post_url, title, slugs, series, contest_url, text) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (post_id) DO UPDATE SET "
+            "post_url = excluded.post_url, title = excluded.title, "
+            "slugs = excluded.slugs, series = excluded.series, "
+            "contest_url = excluded.contest_url, "
+            "text = COALESCE(excluded.text, archive_posts.text)",
+            (
+                int(post.post_id),
+                post.post_url,
+                post.title,
+                " ".join(post.slugs),
+                " ".join(post.series),
+                post.contest_url,
+                post.text,
+            ),
+        )
+        self._db.commit()
+        return True
+
+    def has(self, post_id: int) -> bool:
+        """本文まで入っていれば True（本文なしで入れた告知は埋め戻しで取り直す）。"""
+        row = self._db.execute(
+            "SELECT 1 FROM archive_posts WHERE post_id = ? AND text IS NOT NULL",
+            (post_id,),
+        ).fetchone()
+        return row is not None
+
+    def count(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM archive_posts").fetchone()[0]
+
+    def search(
+        self, query: str | None = None, series: str | None = None, limit: int = 10
+    ) -> list[tuple[Post, str]]:
+        """
+        query の語（空白区切り）をすべて含む告知を (Post, 抜粋) で返す。Post の text は読まない（None）。
+        語があれば関連度順、無ければ（series だけの指定）新しい順。
+        """
+        with ARCHIVE_SEARCH_SECONDS.time():
+            terms = (query or "").split()
+            long_terms = [t for t in terms if len(t) >= 3]
+            where, params = [], []
+            if long_terms:
+                where.append("archive_fts MATCH ?")
+                params.append(" ".join(_quote(t) for t in long_terms))
+            for term in terms:
+                if len(term) < 3:
+                    where.append(
+                        "(p.title LIKE ? ESCAPE '\\' OR p.text LIKE ? ESCAPE '\\' "
+                        "OR p.slugs LIKE ? ESCAPE '\\')"
+                    )
+                    params += [f"%{_escape_like(term)}%"] * 3
+            if series:
+                where.append("instr(' ' || p.series || ' ', ?) > 0")
+                params.append(f" {series} ")
+            if long_terms:
+                sql = (
+                    "SELECT p.post_id, p.post_url, p.title, p.slugs, p.series, "
+                    "p.contest_url, "
+                    "COALESCE(snippet(archive_fts, 1, '**', '**', '…', "
+                    f"{_SNIPPET_TOKENS}), '') "
+                    "FROM archive_fts JOIN archive_posts p ON p.post_id = archive_fts.rowid "
+                    f"WHERE {' AND '.join(where)} ORDER BY rank LIMIT ?"
+                )
+            else:
+                sql = (
+                    "SELECT p.post_id, p.post_url, p.title, p.slugs, p.series, "
+                    "p.contest_url, '' FROM archive_posts p "
+                    f"WHERE {' AND '.join(where) or '1'} "
+                    "ORDER BY p.post_id DESC LIMIT ?"
+                )
+            params.append(limit)
+            rows = self._db.execute(sql, params).fetchall()
+        return [(_post_from_row(*row[:6]), row[6]) for row in rows]
+
+    def close(self):
+        self._db.close()
+
+
+def _post_from_row(post_id, post_url, title, slugs, series, contest_url) -> Post:
+    return Post(
+        str(post_id), post_url, title, slugs.split(), series.split(), contest_url
+    )
+
+
+def _quote(term: str) -> str:
+    # FTS5 の構文として解釈させず、語をそのまま 1 つのフレーズとして探す
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class Backfill:
+    """
+    投稿 ID を top から floor まで新しい順に調べ、fetch(post_id) が返した告知をアーカイブに入れる。
+    fetch は Post（告知でなくてもよい）、存在しない投稿なら None を返し、取得に失敗したら例外を送出する。
+
+    concurrency 件ずつまとめて取り、リクエストの開始は 1 秒に rate 件までに間を空ける。
+    まとめて取った分がすべて済むたびに次に調べる ID を state（StateStore）の kv に書くので、
+    止まっても次回はその続きから再開する。前回より新しい投稿が増えていれば、その分を先に埋める。
+    """
+
+    def __init__(
+        self,
+        archive: Archive,
+        state,
+        fetch,
+        concurrency: int = 2,
+        rate: float = 0.5,
+        floor: int = 1,
+    ):
+        self.archive = archive
+        self.state = state
+        self.fetch = fetch
+        self.concurrency = max(1, concurrency)
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self.floor = max(1, floor)
+        self._next_at = 0.0
+        self._pace_lock = asyncio.Lock()
+
+    async def run(self, top: int):
+        """
+        埋め戻しを最後まで（または失敗するまで）進める。取得に失敗したら
+        進み具合を保存したまま例外を送出する（呼び出し側が時間を置いてやり直す）。
+        """
+        saved_top = int(self.state.get("archive_top") or 0)
+        if saved_top and top > saved_top:
+            # 前回の起動以降に増えた投稿。途中で止まったら次回また頭から調べる（登録済みは飛ばす）
+            await self._crawl(top, saved_top + 1)
+        if not saved_top or top > saved_top:
+            self.state.set("archive_top", str(top))
+            self.state.flush()
+        cursor = int(self.state.get("archive_cursor") or top)
+        if cursor < self.floor:
+            return
+
+        def save(next_id: int):
+            self.state.set("archive_cursor", str(next_id))
+            self.state.flush()
+
+        await self._crawl(cursor, self.floor, save)
+        print(f"告知アーカイブの埋め戻しが完了しました: {self.archive.count()} 件")
+
+    async def _crawl(self, high: int, low: int, save=None):
+        """high から low まで（両端を含む）を新しい順に調べる。"""
+        for start in range(high, low - 1, -self.concurrency):
+            ids = range(start, max(low, start - self.concurrency + 1) - 1, -1)
+            await asyncio.gather(*(self._one(post_id) for post_id in ids))
+            if save is not None:
+                save(ids[-1] - 1)
+
+    async def _one(self, post_id: int):
+        if self.archive.has(post_id):
+            BACKFILL_POSTS.inc(result="skipped")
+            return
+        await self._pace()
+        post = await self.fetch(post_id)
+        if post is None:
+            BACKFILL_POSTS.inc(result="missing")
+        elif self.archive.add(post):
+            BACKFILL_POSTS.inc(result="archived")
+        else:
+            BACKFILL_POSTS.inc(result="skipped")
+
+    async def _pace(self):
+        async with self._pace_lock:
+            wait = self._next_at - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._next_at = time.monotonic() + self.interval
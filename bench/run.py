@@ -0,0 +1,484 @@
+"""
+ホットパスのベンチマーク。記録済み fixtures をローカルのスタンドインサーバから配信し、
+実際の atcoder.jp には一切アクセスしない。
+
+  python bench/run.py                      # 計測して表を出す
+  python bench/run.py --json out.json      # 結果を保存
+  python bench/run.py --baseline out.json  # 保存済みの結果より p95（保持メモリ）が悪化していれば exit 1
+
+後半の表は保持メモリ（作ったものを持ち続けたときに残るバイト数）。レコード数百件分の大きさと、
+ポーリングを繰り返したときに増え続けないか（長時間動かしっぱなしでも平らか）を見る。
+最後にポーリングの状態遷移（移行直後の告知・既読の付け方）を確かめ、おかしければ exit 1。
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import pathlib
+import socket
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+FIXTURES = ROOT / "bench" / "fixtures"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Result:
+    def __init__(self, name: str, timings: list[float], peak_bytes: int):
+        self.name = name
+        self.timings = timings
+        self.peak_bytes = peak_bytes
+
+    @property
+    def ops_per_sec(self) -> float:
+        total = sum(self.timings)
+        return len(self.timings) / total if total else float("inf")
+
+    def percentile(self, q: float) -> float:
+        ordered = sorted(self.timings)
+        idx = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+        return ordered[idx]
+
+    def as_dict(self) -> dict:
+        return {
+            "iterations": len(self.timings),
+            "ops_per_sec": self.ops_per_sec,
+            "p50_ms": self.percentile(0.5) * 1000,
+            "p95_ms": self.percentile(0.95) * 1000,
+            "mean_ms": statistics.fmean(self.timings) * 1000,
+            "peak_kib": self.peak_bytes / 1024,
+        }
+
+
+async def measure(name: str, fn, iterations: int, setup=None) -> Result:
+    """
+    fn を iterations 回実行して所要時間を集める（fn は同期関数でもコルーチン関数でもよい）。
+    最後に 1 回だけ tracemalloc 下で実行し、1 回あたりのピークメモリを測る。
+    """
+
+    async def call():
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        result = fn()
+        if asyncio.iscoroutine(result):
+            await result
+        return time.perf_counter() - started
+
+    await call()  # ウォームアップ
+    timings = [await call() for _ in range(iterations)]
+
+    tracemalloc.start()
+    try:
+        await call()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return Result(name, timings, peak)
+
+
+class Retained:
+    def __init__(self, name: str, retained_bytes: int):
+        self.name = name
+        self.retained_bytes = retained_bytes
+
+    def as_dict(self) -> dict:
+        return {"retained_kib": self.retained_bytes / 1024}
+
+
+async def measure_retained(name: str, fn) -> Retained:
+    """
+    tracemalloc 下で fn を実行し、戻り値を持ったまま（ゴミを回収したうえで）残っているバイト数を測る。
+    fn は同期関数でもコルーチン関数でもよい。
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        kept = fn()
+        if asyncio.iscoroutine(kept):
+            kept = await kept
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del kept
+    return Retained(name, current)
+
+
+async def measure_growth(name: str, fn) -> Retained:
+    """
+    tracemalloc 下で fn を 2 回実行し、2 回目のあいだに増えた保持メモリを測る。
+    1 回目で接続やキャッシュが一杯になった後も増え続けていれば、長く動かすほど膨らむということ。
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        await fn()
+        gc.collect()
+        first, _ = tracemalloc.get_traced_memory()
+        await fn()
+        gc.collect()
+        second, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return Retained(name, max(0, second - first))
+
+
+class _Channel:
+    """送られた内容を記録するだけのチャンネル（状態遷移の確認用）。"""
+
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+        self.sent = []
+
+    async def send(self, *args, **kwargs):
+        self.sent.append(kwargs)
+
+
+async def check_polling(main, parsing, home: str) -> list[str]:
+    """
+    ポーリングの状態遷移を確かめ、おかしければその内容を返す。
+    旧形式の状態（contest:ID のみ・panel_seeded なし）から始めても ID より新しい告知は配信し、
+    購読されていない告知も既読にして、次のポーリングは idle になること。
+    取得に失敗し続ける投稿があっても new を返し続けないこと。
+    """
+    failures = []
+    channel = _Channel(1)
+    main.client.get_channel = lambda channel_id: (
+        channel if channel_id == channel.id else None
+    )
+    main.subscriptions.add_default(channel.id, "abc")
+    main.CONDITIONAL_POLL = False
+
+    links = parsing.contest_panel_links(home)
+    ids = sorted(int(parsing.post_id(post_url)) for _, post_url in links)
+    last_id = ids[len(ids) // 2]
+    main.state_store._seen.clear()
+    main.state_store.set("panel_seeded", None)
+    main.state_store.set("state", f"contest:{last_id}")
+    expected = []
+    for title, post_url in links:
+        if int(parsing.post_id(post_url)) > last_id:
+            post = await main._load_post(post_url, title)
+            if "abc" in post.series:
+                expected.append(post.post_id)
+
+    outcome = await main._poll_once()
+    if outcome != "new":
+        failures.append(f"移行直後のポーリングが {outcome!r}（new のはず）")
+    for post_id in expected:
+        if main.state_store.delivery_status(post_id, channel.id) != main.SENT:
+            failures.append(f"停止中に出た告知 {post_id} が配信されていない")
+    unseen = [
+        post_id
+        for post_id in map(parsing.post_id, (post_url for _, post_url in links))
+        if not main.state_store.is_seen(post_id)
+    ]
+    if unseen:
+        failures.append(f"既読になっていない投稿: {unseen}")
+    outcome = await main._poll_once()
+    if outcome != "idle":
+        failures.append(f"2 回目のポーリングが {outcome!r}（idle のはず）")
+
+    # 購読されていない告知を未処理に戻す: 1 度だけ new になり、既読になって次は idle
+    for title, post_url in links:
+        post = await main._load_post(post_url, title)
+        if post.is_contest and "abc" not in post.series:
+            main.state_store._seen.pop(post.post_id)
+            outcomes = [await main._poll_once(), await main._poll_once()]
+            if outcomes != ["new", "idle"]:
+                failures.append(
+                    f"購読されていない告知 {post.post_id} のポーリングが {outcomes}"
+                )
+            break
+    else:
+        failures.append("fixtures に abc 以外の告知がない")
+
+    # 取得に失敗し続ける投稿: 未処理のまま残るが、ポーリングは new にならない
+    broken_id = parsing.post_id(links[0][1])
+    load_post = main._load_post
+
+    async def failing_load(post_url, title, *args, **kwargs):
+        if parsing.post_id(post_url) == broken_id:
+            return None
+        return await load_post(post_url, title, *args, **kwargs)
+
+    main._load_post = failing_load
+    try:
+        main.state_store._seen.pop(broken_id)
+        outcomes = [await main._poll_once(), await main._poll_once()]
+    finally:
+        main._load_post = load_post
+    if outcomes != ["idle", "idle"]:
+        failures.append(f"取得できない投稿 {broken_id} のポーリングが {outcomes}")
+    if main.state_store.is_seen(broken_id):
+        failures.append(f"取得できない投稿 {broken_id} が既読になった")
+    return failures
+
+
+async def run(args) -> tuple[list[Result], list[Retained], list[str]]:
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    state_dir = tempfile.mkdtemp(prefix="atcoder-bench-")
+    os.environ.update(
+        {
+            "STATE_DIR": state_dir,
+            "ATCODER_URL": f"{base}/home",
+            "ATCODER_BASE": base,
+            "CONTESTS_URL": f"{base}/contests/",
+            "TARGET_CHANNEL_ID": "",
+            "POLL_STATS_LOG_EVERY": "0",
+            # 毎回実際に取得させる（同じ URL の応答の使い回しで計測が歪まないように）
+            "HTTP_REUSE_TTL": "0",
+        }
+    )
+    sys.path.insert(0, str(ROOT))
+    sys.path.insert(0, str(ROOT / "bench"))
+    import extract
+    import main
+    from classify import classifier
+    import parsing
+    import render
+    from records import Post
+    from server import start_server
+
+    runner, _ = await start_server(args.latency_ms / 1000, port=port)
+    await main.http.start()
+
+    home = (FIXTURES / "home.html").read_text()
+    contests_html = (FIXTURES / "contests.html").read_text()
+    post_html = (FIXTURES / "posts" / "1520.html").read_text()
+    body_fragment = extract.body_fragment(post_html)
+    body_node = extract.make_soup(post_html).select_one("div.panel-body.blog-post")
+    n = args.iterations
+
+    def cold_cache():
+        main.post_cache.clear()
+        render.memo_clear()
+
+    def full_poll():
+        main.CONDITIONAL_POLL = False
+
+    def conditional_poll():
+        main.CONDITIONAL_POLL = True
+
+    results = [
+        await measure(
+            "_find_contest_panel (BeautifulSoup)",
+            lambda: parsing.find_contest_panel(extract.make_soup(home)),
+            n,
+        ),
+        await measure(
+            "contest_panel_links (targeted scan)",
+            lambda: parsing.contest_panel_links(home),
+            n,
+        ),
+        await measure(
+            "_find_contest_url (node)",
+            lambda: parsing.find_contest_url(body_node),
+            n * 10,
+        ),
+        await measure(
+            "find_contest_url (fragment regex)",
+            lambda: extract.find_contest_url(body_fragment),
+            n * 10,
+        ),
+        await measure(
+            "classifier.scan (post)",
+            lambda: classifier.scan(post_html),
+            n * 10,
+        ),
+        await measure(
+            "contest_timetable (table scan)",
+            lambda: parsing.contest_timetable(contests_html),
+            n,
+        ),
+        await measure(
+            "render_post (cold memo)",
+            lambda: parsing.render_post(post_html),
+            n,
+            setup=render.memo_clear,
+        ),
+        await measure(
+            "render_post (memo hit)",
+            lambda: parsing.render_post(post_html),
+            n,
+        ),
+        await measure(
+            "check_atcoder_loop tick (200)", main._poll_once, n, setup=full_poll
+        ),
+        await measure(
+            "check_atcoder_loop tick (304)",
+            main._poll_once,
+            n,
+            setup=conditional_poll,
+        ),
+        await measure(
+            "_fetch_latest_series_announcement agc (cold)",
+            lambda: main._fetch_latest_series_announcement("agc"),
+            max(3, n // 4),
+            setup=cold_cache,
+        ),
+        await measure(
+            "_fetch_latest_series_announcement agc (warm)",
+            lambda: main._fetch_latest_series_announcement("agc"),
+            n,
+        ),
+    ]
+
+    template = parsing.parse_post(
+        f"{base}/posts/1520", "AtCoder Beginner Contest", post_html, with_text=True
+    )
+    records = args.records
+
+    def posts_as_records():
+        return [
+            Post(
+                str(i),
+                f"{base}/posts/{i}",
+                template.title,
+                template.slugs,
+                template.series,
+                template.contest_url,
+                template.text,
+                0.0,
+            )
+            for i in range(records)
+        ]
+
+    def posts_as_dicts():
+        # 以前の dict 表現（比較用）
+        return [
+            {
+                **template.to_dict(),
+                "post_id": str(i),
+                "post_url": f"{base}/posts/{i}",
+                "slugs": [s.encode().decode() for s in template.slugs],
+                "series": [s.encode().decode() for s in template.series],
+            }
+            for i in range(records)
+        ]
+
+    async def soak():
+        for _ in range(args.soak):
+            await main._poll_once()
+
+    retained = [
+        await measure_retained(f"posts x{records} (Post records)", posts_as_records),
+        await measure_retained(f"posts x{records} (dicts)", posts_as_dicts),
+        await measure_retained(
+            "contest_timetable (Contest records)",
+            lambda: parsing.contest_timetable(contests_html),
+        ),
+        await measure_retained(
+            "contest_panel_links (soup fallback)",
+            lambda: parsing.page_post_links(home),
+        ),
+    ]
+    main.CONDITIONAL_POLL = False
+    retained.append(await measure_growth(f"poll ticks x{args.soak} (growth)", soak))
+    failures = await check_polling(main, parsing, home)
+
+    await main.http.close()
+    main.parse_pool.shutdown()
+    await runner.cleanup()
+    return results, retained, failures
+
+
+def _print_table(results: list[Result]):
+    header = f"{'benchmark':<48} {'iter':>5} {'ops/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'peak KiB':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        d = r.as_dict()
+        print(
+            f"{r.name:<48} {d['iterations']:>5} {d['ops_per_sec']:>10.1f} "
+            f"{d['p50_ms']:>9.2f} {d['p95_ms']:>9.2f} {d['peak_kib']:>9.1f}"
+        )
+
+
+def _print_retained(retained: list[Retained]):
+    header = f"{'retained memory':<48} {'KiB':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in retained:
+        print(f"{r.name:<48} {r.retained_bytes / 1024:>9.1f}")
+
+
+def _compare(
+    results: list[Result],
+    retained: list[Retained],
+    baseline_path: str,
+    tolerance: float,
+) -> int:
+    baseline = json.loads(pathlib.Path(baseline_path).read_text())
+    regressions = 0
+    for r in results:
+        base = baseline.get(r.name)
+        if not base or "p95_ms" not in base:
+            continue
+        now = r.as_dict()["p95_ms"]
+        if now > base["p95_ms"] * (1 + tolerance):
+            regressions += 1
+            print(f"REGRESSION: {r.name}: p95 {base['p95_ms']:.2f}ms -> {now:.2f}ms")
+    for r in retained:
+        base = baseline.get(r.name)
+        if not base or "retained_kib" not in base:
+            continue
+        now = r.as_dict()["retained_kib"]
+        # 数 KiB の揺れは誤差として扱う
+        if now > base["retained_kib"] * (1 + tolerance) + 4:
+            regressions += 1
+            print(
+                f"REGRESSION: {r.name}: retained "
+                f"{base['retained_kib']:.1f}KiB -> {now:.1f}KiB"
+            )
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AtCoder watch bot benchmarks")
+    parser.add_argument("--iterations", type=int, default=40)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--json", help="結果を JSON で保存するパス")
+    parser.add_argument("--baseline", help="比較対象の JSON")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument(
+        "--records", type=int, default=512, help="保持メモリを測るレコード数"
+    )
+    parser.add_argument(
+        "--soak", type=int, default=50, help="保持メモリの増加を測るポーリング回数"
+    )
+    args = parser.parse_args()
+
+    results, retained, failures = asyncio.run(run(args))
+    _print_table(results)
+    print()
+    _print_retained(retained)
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    if args.json:
+        out = {r.name: r.as_dict() for r in results}
+        out.update({r.name: r.as_dict() for r in retained})
+        pathlib.Path(args.json).write_text(json.dumps(out, indent=2))
+    code = (
+        _compare(results, retained, args.baseline, args.tolerance)
+        if args.baseline
+        else 0
+    )
+    sys.exit(1 if failures else code)
+
+
+if __name__ == "__main__":
+    main()
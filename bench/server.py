@@ -0,0 +1,79 @@
+"""
+ベンチマーク用の AtCoder スタンドインサーバ。bench/fixtures に記録した HTML を返す。
+/home は ETag を返し、If-None-Match が一致すれば 304 を返す。
+
+単体起動: python bench/server.py --port 8080 --latency-ms 50
+"""
+
+import argparse
+import asyncio
+import hashlib
+import pathlib
+
+from aiohttp import web
+
+FIXTURES = pathlib.Path(__file__).parent / "fixtures"
+
+
+def _load_pages() -> dict[str, str]:
+    pages = {
+        "/home": (FIXTURES / "home.html").read_text(),
+        "/contests/": (FIXTURES / "contests.html").read_text(),
+    }
+    for path in sorted((FIXTURES / "posts").glob("*.html")):
+        pages[f"/posts/{path.stem}"] = path.read_text()
+    return pages
+
+
+def make_app(latency: float = 0.0) -> web.Application:
+    """latency 秒の遅延を入れて fixtures を返すアプリを作る。"""
+    pages = _load_pages()
+    etags = {
+        path: '"' + hashlib.sha1(body.encode("utf-8")).hexdigest() + '"'
+        for path, body in pages.items()
+    }
+    app = web.Application()
+    app["hits"] = {}
+
+    async def handler(request: web.Request) -> web.Response:
+        if latency:
+            await asyncio.sleep(latency)
+        path = request.path
+        app["hits"][path] = app["hits"].get(path, 0) + 1
+        body = pages.get(path)
+        if body is None:
+            return web.Response(status=404, text="not found")
+        etag = etags[path]
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(text=body, content_type="text/html", headers={"ETag": etag})
+
+    app.router.add_get("/home", handler)
+    app.router.add_get("/contests/", handler)
+    app.router.add_get("/posts/{post_id}", handler)
+    return app
+
+
+async def start_server(
+    latency: float = 0.0, host: str = "127.0.0.1", port: int = 0
+) -> tuple[web.AppRunner, str]:
+    """サーバを起動し (runner, ベースURL) を返す。port=0 なら空きポートを使う。"""
+    runner = web.AppRunner(make_app(latency))
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AtCoder stand-in server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    web.run_app(make_app(args.latency_ms / 1000), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
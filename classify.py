@@ -0,0 +1,90 @@
+"""
+コンテストのシリーズ判定。
+
+ルール表（シリーズ名, スラッグの正規表現）を名前付きグループの選択肢として 1 本の正規表現にまとめ、
+投稿の生 HTML を 1 回走査するだけで /contests/{slug} の抽出とシリーズ判定を同時に行う。
+追跡するシリーズが増えても走査は 1 回のまま。ルールは上にあるものほど優先される。
+
+SERIES_RULES 環境変数（"名前=正規表現;名前=正規表現"）で既定のルールを上書き・追加できる。
+正規表現の中では捕捉グループを使わず (?:...) を使う。
+"""
+
+import os
+import re
+
+DEFAULT_RULES = [
+    ("abc", r"abc\d+"),
+    ("arc", r"arc\d+"),
+    ("agc", r"agc\d+"),
+    ("ahc", r"ahc\d+"),
+    # AtCoder Daily Training（adt_all_20250101_1 など）
+    ("adt", r"adt_[a-z]+_\d+(?:_\d+)?"),
+    # アルゴリズム実技検定（past202412-open, past17-open など）
+    ("past", r"past\d+[a-z0-9_\-]*"),
+    # World Tour Finals（awtf2024, wtf22-day1 など）
+    ("wtf", r"a?wtf\d+[a-z0-9_\-]*"),
+    # 企業コンテスト（社名 + 年: jsc2025final, panasonic2024 など）。
+    # 年を含む他のシリーズを飲み込まないよう、上のルールに当たる名前で始まるものは除く
+    ("sponsored", r"(?!past\d|a?wtf\d)[a-z][a-z\-]*?20\d\d[a-z0-9_\-]*"),
+]
+
+# /contests/ 配下だがコンテストではないページ
+NON_CONTEST_SLUGS = {"archive"}
+
+_SLUG_CHARS = r"[A-Za-z0-9_\-]"
+
+
+def rules_from_env(spec: str | None) -> list[tuple[str, str]]:
+    """SERIES_RULES の指定を既定のルールに重ねる。指定したルールは既定より優先される。"""
+    overrides = []
+    for part in (spec or "").split(";"):
+        name, _, pattern = part.partition("=")
+        name, pattern = name.strip().lower(), pattern.strip()
+        if name and pattern:
+            overrides.append((name, pattern))
+    names = {name for name, _ in overrides}
+    return overrides + [rule for rule in DEFAULT_RULES if rule[0] not in names]
+
+
+class SeriesClassifier:
+    def __init__(self, rules: list[tuple[str, str]]):
+        self.rules = list(rules)
+        self.names = [name for name, _ in self.rules]
+        self._group_series = {f"s{i}": name for i, name in enumerate(self.names)}
+        alternatives = "".join(
+            f"(?P<s{i}>{pattern})|" for i, (_, pattern) in enumerate(self.rules)
+        )
+        # どのルールにも当たらないスラッグは other で拾う（シリーズなし）
+        slug = rf"(?:{alternatives}(?P<other>{_SLUG_CHARS}+))(?!{_SLUG_CHARS})"
+        self._slug_re = re.compile(slug, re.IGNORECASE)
+        self._scan_re = re.compile(
+            rf"(?:https?://atcoder\.jp)?/contests/{slug}", re.IGNORECASE
+        )
+
+    def classify(self, slug: str) -> str:
+        """スラッグのシリーズ名。どのルールにも当たらなければ空文字。"""
+        m = self._slug_re.fullmatch(slug)
+        return self._group_series.get(m.lastgroup, "") if m else ""
+
+    def scan(self, text: str) -> list[tuple[str, str]]:
+        """
+        text 中の /contests/{slug} を出現順（重複なし）に (slug, シリーズ名) で返す。
+        スラッグは小文字にそろえる。
+        """
+        out = []
+        seen = set()
+        for m in self._scan_re.finditer(text):
+            slug = m.group(m.lastgroup).lower()
+            if slug in seen or slug in NON_CONTEST_SLUGS:
+                continue
+            seen.add(slug)
+            out.append((slug, self._group_series.get(m.lastgroup, "")))
+        return out
+
+    def series_of(self, slugs_series: list[tuple[str, str]]) -> list[str]:
+        """scan() の結果に含まれるシリーズをルール表の順に返す。"""
+        found = {series for _, series in slugs_series if series}
+        return [name for name in self.names if name in found]
+
+
+classifier = SeriesClassifier(rules_from_env(os.getenv("SERIES_RULES")))
@@ -0,0 +1,141 @@
+"""
+複数プロセス（AutoShardedBot のシャード分割）で動かすときの調整。
+
+- LeaderLock: 共有の STATE_DIR にあるロックファイルを flock できたプロセスだけがポーラーになる。
+  ポーラーが落ちれば OS がロックを外すので、待機中のプロセスが引き継ぐ
+- ShardIPC: ローカルの unix ソケットで、ポーラーが検知した配信をギルドを担当するシャードのプロセスへ渡す
+"""
+
+import asyncio
+import fcntl
+import json
+import os
+import pathlib
+
+import discord
+
+
+def shard_for_guild(guild_id: int, shard_count: int) -> int:
+    """Discord の規則でギルドを担当するシャード番号。"""
+    return (guild_id >> 22) % shard_count
+
+
+class LeaderLock:
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self._fd: int | None = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        """ロックを取れれば True（取れるまで待たない）。"""
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+
+def encode_message(kwargs: dict) -> dict:
+    """send の kwargs を JSON にできる形にする。"""
+    data = {"content": kwargs.get("content"), "nonce": kwargs.get("nonce")}
+    embeds = kwargs.get("embeds") or ([kwargs["embed"]] if kwargs.get("embed") else [])
+    if embeds:
+        data["embeds"] = [embed.to_dict() for embed in embeds]
+    if kwargs.get("allowed_mentions") is not None:
+        data["mention_roles"] = bool(kwargs["allowed_mentions"].roles)
+    return data
+
+
+def decode_message(data: dict) -> dict:
+    kwargs = {}
+    if data.get("content"):
+        kwargs["content"] = data["content"]
+    if data.get("nonce") is not None:
+        kwargs["nonce"] = data["nonce"]
+    if data.get("embeds"):
+        kwargs["embeds"] = [discord.Embed.from_dict(e) for e in data["embeds"]]
+    if "mention_roles" in data:
+        kwargs["allowed_mentions"] = discord.AllowedMentions(
+            roles=data["mention_roles"]
+        )
+    return kwargs
+
+
+class ShardIPC:
+    """
+    担当シャードごとに socket_dir/shard-{id}.sock で待ち受け、1 行の JSON を受け取って
+    handler(message) の戻り値（dict）を 1 行の JSON で返す。
+    request(shard_id, message) はそのシャードを担当するプロセスへ送って応答を待つ。
+    """
+
+    def __init__(self, socket_dir, shard_ids: list[int], handler, timeout: float = 60):
+        self.socket_dir = pathlib.Path(socket_dir)
+        self.shard_ids = list(shard_ids)
+        self.handler = handler
+        self.timeout = timeout
+        self._servers: list[asyncio.AbstractServer] = []
+
+    def _path(self, shard_id: int) -> pathlib.Path:
+        return self.socket_dir / f"shard-{shard_id}.sock"
+
+    async def start(self):
+        for shard_id in self.shard_ids:
+            path = self._path(shard_id)
+            # 前回落ちたプロセスが残したソケットファイルは消してから待ち受ける
+            path.unlink(missing_ok=True)
+            self._servers.append(
+                await asyncio.start_unix_server(self._serve, path=str(path))
+            )
+
+    async def stop(self):
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers = []
+        for shard_id in self.shard_ids:
+            self._path(shard_id).unlink(missing_ok=True)
+
+    async def request(self, shard_id: int, message: dict) -> dict:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_unix_connection(str(self._path(shard_id))), self.timeout
+        )
+        try:
+            writer.write(json.dumps(message, ensure_ascii=False).encode() + b"\n")
+            await writer.drain()
+            line = await asyncio.wait_for(reader.readline(), self.timeout)
+            if not line:
+                raise ConnectionError(f"shard {shard_id} が応答せずに切断しました")
+            return json.loads(line)
+        finally:
+            writer.close()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while line := await reader.readline():
+                try:
+                    response = await self.handler(json.loads(line))
+                except Exception as e:
+                    print("シャード間メッセージの処理エラー:", e)
+                    response = {"error": str(e)}
+                writer.write(json.dumps(response, ensure_ascii=False).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,156 @@
+import asyncio
+import collections
+import random
+import time
+
+import discord
+
+from metrics import registry
+
+DELIVERIES = registry.counter(
+    "delivery_total", "配信結果（result=sent/retried/failed）"
+)
+DELIVERY_SECONDS = registry.histogram(
+    "delivery_seconds", "配信を受け付けてから送信完了までの時間（リトライ込み）"
+)
+
+
+class _RouteLimiter:
+    """チャンネル（= メッセージ送信のルート）毎に window 秒あたり rate 通までに抑える。"""
+
+    def __init__(self, rate: int, window: float):
+        self.rate = rate
+        self.window = window
+        self._sent: dict[int, collections.deque] = {}
+        self._locks: dict[int, asyncio.Lock] = {}
+
+    async def acquire(self, route: int):
+        lock = self._locks.setdefault(route, asyncio.Lock())
+        async with lock:
+            sent = self._sent.setdefault(route, collections.deque())
+            now = time.monotonic()
+            while sent and now - sent[0] >= self.window:
+                sent.popleft()
+            if len(sent) >= self.rate:
+                await asyncio.sleep(self.window - (now - sent[0]))
+                sent.popleft()
+            sent.append(time.monotonic())
+
+
+class _Job:
+    __slots__ = ("channel_id", "kwargs", "attempts", "future", "queued_at")
+
+    def __init__(self, channel_id: int, kwargs: dict, future: asyncio.Future):
+        self.channel_id = channel_id
+        self.kwargs = kwargs
+        self.attempts = 0
+        self.future = future
+        self.queued_at = time.perf_counter()
+
+
+class Deliverer:
+    """
+    複数チャンネルへの並列配信。ワーカーが有限長のキューから取り出して送信し、
+    チャンネル毎のレート制限を守る。一時的な失敗（5xx / 429 / 通信エラー）は
+    指数バックオフで max_attempts 回まで再投入する（キューが満杯なら諦める）。
+
+    resolve(channel_id) はチャンネルを返すコルーチン関数、send(channel, **kwargs) は送信関数。
+    """
+
+    def __init__(
+        self,
+        resolve,
+        send,
+        workers: int = 8,
+        queue_size: int = 1000,
+        max_attempts: int = 4,
+        route_rate: int = 5,
+        route_window: float = 5.0,
+    ):
+        self.resolve = resolve
+        self.send = send
+        self.workers = max(1, workers)
+        self.max_attempts = max_attempts
+        self._limiter = _RouteLimiter(route_rate, route_window)
+        self._queue: asyncio.Queue[_Job] = asyncio.Queue(maxsize=queue_size)
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    async def deliver(self, messages: dict[int, dict]) -> dict[int, bool]:
+        """
+        {channel_id: send の kwargs} を並列に配信し、すべて終わるまで待つ。
+        戻り値は {channel_id: 成功したか}。
+        """
+        self.start()
+        loop = asyncio.get_running_loop()
+        jobs = [
+            _Job(channel_id, kwargs, loop.create_future())
+            for channel_id, kwargs in messages.items()
+        ]
+        for job in jobs:
+            await self._queue.put(job)
+        results = await asyncio.gather(*(job.future for job in jobs))
+        return {job.channel_id: ok for job, ok in zip(jobs, results)}
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._attempt(job)
+            finally:
+                self._queue.task_done()
+
+    async def _attempt(self, job: _Job):
+        job.attempts += 1
+        try:
+            channel = await self.resolve(job.channel_id)
+            if channel is None:
+                self._finish(job, False, "チャンネルが見つかりません")
+                return
+            await self._limiter.acquire(job.channel_id)
+            await self.send(channel, **job.kwargs)
+        except (discord.Forbidden, discord.NotFound) as e:
+            self._finish(job, False, f"送信できません: {e!r}")
+        except (discord.HTTPException, OSError, asyncio.TimeoutError) as e:
+            if isinstance(e, discord.HTTPException) and 400 <= e.status < 500:
+                if e.status != 429:
+                    self._finish(job, False, f"送信が拒否されました: {e}")
+                    return
+            if job.attempts >= self.max_attempts:
+                self._finish(job, False, f"再試行の上限に達しました: {e}")
+                return
+            DELIVERIES.inc(result="retried")
+            asyncio.get_running_loop().call_later(
+                min(30.0, 2**job.attempts) * random.uniform(0.5, 1.0),
+                self._requeue,
+                job,
+            )
+        except Exception as e:
+            self._finish(job, False, f"送信エラー: {e!r}")
+        else:
+            self._finish(job, True)
+
+    def _requeue(self, job: _Job):
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self._finish(job, False, "再送キューが満杯です")
+
+    def _finish(self, job: _Job, ok: bool, reason: str = ""):
+        if ok:
+            DELIVERIES.inc(result="sent")
+            DELIVERY_SECONDS.observe(time.perf_counter() - job.queued_at)
+        else:
+            DELIVERIES.inc(result="failed")
+            print(f"配信失敗 channel={job.channel_id}:", reason)
+        if not job.future.done():
+            job.future.set_result(ok)
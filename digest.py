@@ -0,0 +1,174 @@
+import asyncio
+import hashlib
+
+import discord
+
+from metrics import registry
+
+# Discord の 1 メッセージあたりの上限
+MAX_EMBEDS = 10
+MAX_EMBED_CHARS = 6000
+MAX_CONTENT = 2000
+
+DIGEST_MESSAGES = registry.counter(
+    "digest_messages_total",
+    "まとめ送信したメッセージ数と、まとめた配信の数（kind=message/item）",
+)
+
+
+def pack_pages(
+    items: list[tuple[str, list[discord.Embed]]],
+) -> list[tuple[list[str], list[discord.Embed], list[int]]]:
+    """
+    (content, embeds) の並びを、上限（embed 10 個・embed の合計 6000 文字・content 2000 文字）に
+    収まるメッセージ単位に詰める。戻り値は (content の行, embeds, 含まれる項目の添字) の並び。
+    同じ content の行は 1 回だけ書く。
+    """
+    pages = []
+    lines: list[str] = []
+    embeds: list[discord.Embed] = []
+    members: list[int] = []
+    chars = 0
+
+    def flush():
+        nonlocal lines, embeds, members, chars
+        if lines or embeds:
+            pages.append((lines, embeds, members))
+        lines, embeds, members, chars = [], [], [], 0
+
+    for index, (content, item_embeds) in enumerate(items):
+        for i, embed in enumerate(item_embeds or [None]):
+            line = content if i == 0 and content and content not in lines else None
+            size = len(embed) if embed is not None else 0
+            content_len = len("\n".join(lines + [line])) if line else 0
+            if (
+                embed is not None
+                and (len(embeds) >= MAX_EMBEDS or chars + size > MAX_EMBED_CHARS)
+            ) or content_len > MAX_CONTENT:
+                flush()
+            if line:
+                lines.append(line)
+            if embed is not None:
+                embeds.append(embed)
+                chars += size
+            if not members or members[-1] != index:
+                members.append(index)
+    flush()
+    return pages
+
+
+class _Item:
+    __slots__ = ("delivery_id", "kwargs", "future")
+
+    def __init__(self, delivery_id: str, kwargs: dict, future: asyncio.Future):
+        self.delivery_id = delivery_id
+        self.kwargs = kwargs
+        self.future = future
+
+
+class DigestQueue:
+    """
+    チャンネルごとに window 秒のあいだ届いた配信を溜め、まとめて送る。
+    溜まった配信の content と embed をつなげ、上限に収まる最少のメッセージに詰めて
+    deliver({channel_id: kwargs}) で順に送る。window=0 でも同じループの周回で
+    届いたもの（同時に見つかった告知・同時刻のリマインダ）はまとめる。
+
+    submit() は配信 1 件（send の kwargs）を受け付け、それを含むメッセージがすべて
+    送れたかを返す（同じまとめの他の配信を待たず、自分の最後のメッセージを送った時点で返る）。
+    alone=True の配信（前回の送信途中で落ちたものの送り直し）は他とまとめず、すぐに単独で送る。
+    まとめ方は再起動の前後で同じにならず nonce が変わるので、単独で送って毎回同じ nonce にする。
+    """
+
+    def __init__(self, deliver, window: float = 0.0):
+        self.deliver = deliver
+        self.window = window
+        self._pending: dict[int, list[_Item]] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(
+        self, channel_id: int, delivery_id: str, kwargs: dict, alone: bool = False
+    ) -> bool:
+        loop = asyncio.get_running_loop()
+        item = _Item(delivery_id, kwargs, loop.create_future())
+        if alone:
+            self._spawn(channel_id, [item])
+            return await item.future
+        items = self._pending.get(channel_id)
+        if items is None:
+            items = self._pending[channel_id] = []
+            loop.call_later(self.window, self._start_flush, channel_id)
+        items.append(item)
+        return await item.future
+
+    def _start_flush(self, channel_id: int):
+        self._spawn(channel_id, self._pending.pop(channel_id, []))
+
+    def _spawn(self, channel_id: int, items: list[_Item]):
+        task = asyncio.create_task(self._flush(channel_id, items))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, channel_id: int, items: list[_Item]):
+        ok = [True] * len(items)
+        try:
+            if len(items) == 1 and len(items[0].kwargs.get("embeds") or ()) <= 1:
+                # まとめるものが無ければそのまま送る（nonce も呼び出し側のもの）
+                results = await self.deliver({channel_id: items[0].kwargs})
+                ok[0] = results.get(channel_id, False)
+                return
+            pages = pack_pages(
+                [
+                    (
+                        item.kwargs.get("content") or "",
+                        item.kwargs.get("embeds")
+                        or ([item.kwargs["embed"]] if item.kwargs.get("embed") else []),
+                    )
+                    for item in items
+                ]
+            )
+            DIGEST_MESSAGES.inc(len(pages), kind="message")
+            DIGEST_MESSAGES.inc(len(items), kind="item")
+            # 配信ごとに、それを含む最後のメッセージの番号
+            last_page = {
+                index: page_no
+                for page_no, (_, _, members) in enumerate(pages)
+                for index in members
+            }
+            for page_no, (lines, embeds, members) in enumerate(pages):
+                kwargs = {
+                    "allowed_mentions": discord.AllowedMentions(roles=True),
+                    "nonce": self._nonce(channel_id, items, members, page_no),
+                }
+                if lines:
+                    kwargs["content"] = "\n".join(lines)
+                if embeds:
+                    kwargs["embeds"] = embeds
+                results = await self.deliver({channel_id: kwargs})
+                if not results.get(channel_id, False):
+                    for index in members:
+                        ok[index] = False
+                # 送り終えた配信はすぐに結果を返し、呼び出し側に送信済みを記録させる
+                for index in members:
+                    if last_page[index] == page_no and not items[index].future.done():
+                        items[index].future.set_result(ok[index])
+        except Exception as e:
+            print(f"まとめ送信エラー channel={channel_id}:", e)
+            ok = [False] * len(items)
+        finally:
+            for item, result in zip(items, ok):
+                if not item.future.done():
+                    item.future.set_result(result)
+
+    @staticmethod
+    def _nonce(
+        channel_id: int, items: list[_Item], members: list[int], page_no: int
+    ) -> int:
+        # 同じ配信の組み合わせ・同じページなら同じ nonce（再送を Discord 側で重複排除させる）
+        ids = ",".join(items[index].delivery_id for index in members)
+        digest = hashlib.sha256(f"{ids}:{channel_id}:{page_no}".encode()).hexdigest()
+        return int(digest[:15], 16)
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
@@ -0,0 +1,319 @@
+"""
+AtCoder のページから必要な部分だけを取り出す抽出エンジン。
+
+- 高速バックエンド: lxml が入っていれば BeautifulSoup のパーサに lxml を使う（PARSER_BACKEND で指定可）
+- 対象限定モード: 標準ライブラリの HTMLParser で先頭から読み、目的の要素が閉じた時点で打ち切る
+どちらも見つからなければ None を返し、呼び出し側は BeautifulSoup でのフォールバックに回す。
+"""
+
+import html
+import importlib.util
+import os
+import re
+from html.parser import HTMLParser
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+
+PANEL_HEADING = "直近のコンテストの告知"
+_HEADINGS = ("h1", "h2", "h3")
+
+_CONTEST_HREF_RE = re.compile(
+    r"""href\s*=\s*["']([^"']*/contests/[A-Za-z0-9_\-]+[^"']*)["']""", re.IGNORECASE
+)
+_CONTEST_TEXT_RE = re.compile(r"https?://atcoder\.jp/contests/([A-Za-z0-9_\-]+)/?")
+_TITLE_RE = re.compile(r"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+
+
+def _pick_backend() -> str:
+    backend = os.getenv("PARSER_BACKEND", "auto").lower()
+    if backend in ("auto", "lxml"):
+        # 有無だけを調べる（読み込むのは BeautifulSoup が使うときだけ）
+        if importlib.util.find_spec("lxml") is not None:
+            return "lxml"
+        if backend == "lxml":
+            print(
+                "PARSER_BACKEND=lxml ですが lxml が見つかりません。html.parser を使います"
+            )
+    return "html.parser"
+
+
+BACKEND = _pick_backend()
+
+
+def make_soup(html_text: str) -> "BeautifulSoup":
+    """
+    選択済みバックエンドで BeautifulSoup を作る。
+    bs4 は重いので、起動を速くするため最初に必要になったときに読み込む。
+    """
+    from bs4 import BeautifulSoup
+
+    return BeautifulSoup(html_text, BACKEND)
+
+
+class _Done(Exception):
+    """目的の要素を読み終えたので以降の入力を捨てる。"""
+
+
+class PanelScanner(HTMLParser):
+    """
+    『直近のコンテストの告知』パネルを先頭から探し、パネル内の /posts/ リンクを集める。
+    パネルの閉じタグに達した時点で done になり、それ以降は読まない。
+    feed() は分割して呼んでよい（ストリーミング入力用）。
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.found = False
+        self.done = False
+        self.links: list[tuple[str, str]] = []
+        self._div_stack: list[bool] = []  # 各 div が panel クラスを持つか
+        self._panel_depth: int | None = None  # 対象パネルの div の深さ
+        self._heading_text: list[str] | None = None
+        self._link_href: str | None = None
+        self._link_text: list[str] = []
+
+    def feed(self, data: str):
+        if self.done:
+            return
+        try:
+            super().feed(data)
+        except _Done:
+            self.done = True
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "div":
+            classes = (dict(attrs).get("class") or "").split()
+            self._div_stack.append("panel" in classes)
+        elif tag in _HEADINGS and not self.found and any(self._div_stack):
+            self._heading_text = []
+        elif tag == "a" and self.found:
+            href = dict(attrs).get("href") or ""
+            if href.startswith("/posts/"):
+                self._link_href = href
+                self._link_text = []
+
+    def handle_endtag(self, tag):
+        if tag == "div" and self._div_stack:
+            self._div_stack.pop()
+            if (
+                self._panel_depth is not None
+                and len(self._div_stack) < self._panel_depth
+            ):
+                raise _Done
+        elif tag in _HEADINGS and self._heading_text is not None:
+            if PANEL_HEADING in "".join(self._heading_text):
+                self.found = True
+                # 元の実装と同じく、見出しを含む最も外側の panel を対象にする
+                self._panel_depth = self._div_stack.index(True) + 1
+            self._heading_text = None
+        elif tag == "a" and self._link_href is not None:
+            title = "".join(self._link_text).strip()
+            self.links.append((title, self._link_href))
+            self._link_href = None
+
+    def handle_data(self, data):
+        if self._heading_text is not None:
+            self._heading_text.append(data)
+        if self._link_href is not None:
+            self._link_text.append(data)
+
+
+class BodyScanner(HTMLParser):
+    """
+    投稿ページの本文 div（div.panel-body.blog-post、無ければ最初の div.panel-body）の
+    開始・終了位置を記録する。blog-post の div が閉じた時点で打ち切る。
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.done = False
+        self.span: tuple[int, int] | None = None
+        self._fallback: tuple[int, int] | None = None
+        self._data = ""
+        self._line_starts = [0]
+        self._depth = 0
+        self._open: dict[int, tuple[int, bool]] = {}  # 深さ → (開始位置, blog-post か)
+
+    def feed(self, data: str):
+        if self.done:
+            return
+        # getpos() の (行, 列) を絶対位置に直すため行頭位置を記録しておく
+        base = len(self._data)
+        pos = data.find("\n")
+        while pos != -1:
+            self._line_starts.append(base + pos + 1)
+            pos = data.find("\n", pos + 1)
+        self._data += data
+        try:
+            super().feed(data)
+        except _Done:
+            self.done = True
+
+    def _offset(self) -> int:
+        line, col = self.getpos()
+        return self._line_starts[line - 1] + col
+
+    def handle_starttag(self, tag, attrs):
+        if tag != "div":
+            return
+        self._depth += 1
+        classes = (dict(attrs).get("class") or "").split()
+        if "panel-body" in classes:
+            self._open[self._depth] = (self._offset(), "blog-post" in classes)
+
+    def handle_endtag(self, tag):
+        if tag != "div":
+            return
+        opened = self._open.pop(self._depth, None)
+        self._depth -= 1
+        if opened is None:
+            return
+        start, is_blog_post = opened
+        end = self._data.find(">", self._offset()) + 1
+        if is_blog_post:
+            self.span = (start, end)
+            raise _Done
+        if self._fallback is None:
+            self._fallback = (start, end)
+
+    def result(self) -> tuple[int, int] | None:
+        return self.span or self._fallback
+
+
+class ContestTableScanner(HTMLParser):
+    """
+    /contests/ の div#contest-table-{name} 内の表を行ごとに読む。
+    rows は (表の名前, [各セルのテキスト], 行内の最初の /contests/ リンク, そのリンクテキスト) のリスト。
+    tables に挙げた表をすべて読み終えた時点で打ち切る。
+    """
+
+    def __init__(self, tables=("action", "upcoming")):
+        super().__init__(convert_charrefs=True)
+        self.done = False
+        self.rows: list[tuple[str, list[str], str | None, str]] = []
+        self._wanted = {f"contest-table-{name}": name for name in tables}
+        self._remaining = set(self._wanted)
+        self._div_depth = 0
+        self._table: tuple[str, int] | None = None  # (名前, 対象 div の深さ)
+        self._cells: list[str] | None = None
+        self._cell: list[str] | None = None
+        self._href: str | None = None
+        self._link_text: list[str] | None = None
+        self._link_name = ""
+
+    def feed(self, data: str):
+        if self.done:
+            return
+        try:
+            super().feed(data)
+        except _Done:
+            self.done = True
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "div":
+            self._div_depth += 1
+            div_id = dict(attrs).get("id")
+            if div_id in self._wanted and self._table is None:
+                self._table = (self._wanted[div_id], self._div_depth)
+                self._remaining.discard(div_id)
+        elif self._table is None:
+            return
+        elif tag == "tr":
+            self._cells = []
+            self._href = None
+            self._link_name = ""
+        elif tag == "td" and self._cells is not None:
+            self._cell = []
+        elif tag == "a" and self._cells is not None and self._href is None:
+            href = dict(attrs).get("href") or ""
+            if href.startswith("/contests/") and href.rstrip("/") != "/contests":
+                self._href = href
+                self._link_text = []
+
+    def handle_endtag(self, tag):
+        if tag == "div":
+            if self._table is not None and self._div_depth == self._table[1]:
+                self._table = None
+                if not self._remaining:
+                    raise _Done
+            self._div_depth -= 1
+        elif self._table is None:
+            return
+        elif tag == "td" and self._cell is not None:
+            self._cells.append(" ".join("".join(self._cell).split()))
+            self._cell = None
+        elif tag == "a" and self._link_text is not None:
+            self._link_name = "".join(self._link_text).strip()
+            self._link_text = None
+        elif tag == "tr" and self._cells:
+            self.rows.append((self._table[0], self._cells, self._href, self._link_name))
+            self._cells = None
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+        if self._link_text is not None:
+            self._link_text.append(data)
+
+
+def contest_table_rows(
+    html_text: str, tables=("action", "upcoming")
+) -> list[tuple[str, list[str], str | None, str]]:
+    """/contests/ の指定した表の行を返す（ContestTableScanner.rows と同じ形）。"""
+    scanner = ContestTableScanner(tables)
+    scanner.feed(html_text)
+    if not scanner.done:
+        scanner.close()
+    return scanner.rows
+
+
+def panel_post_links(html_text: str) -> list[tuple[str, str]] | None:
+    """
+    対象限定モードでパネル内の投稿リンクを (title, href) で返す。
+    パネルが見つからなければ None（BeautifulSoup のフォールバックへ）。
+    """
+    scanner = PanelScanner()
+    try:
+        scanner.feed(html_text)
+        if not scanner.done:
+            scanner.close()
+    except Exception:
+        return None
+    return scanner.links if scanner.found else None
+
+
+def body_fragment(post_html: str) -> str | None:
+    """投稿ページから本文 div の HTML 断片だけを切り出す。見つからなければ None。"""
+    scanner = BodyScanner()
+    try:
+        scanner.feed(post_html)
+        if not scanner.done:
+            scanner.close()
+    except Exception:
+        return None
+    span = scanner.result()
+    return post_html[span[0] : span[1]] if span else None
+
+
+def find_contest_url(html_text: str) -> str | None:
+    """
+    HTML 文字列から /contests/{slug} の URL を返す（ルート /contests/ は除外）。
+    href を優先し、なければ本文中のプレーンテキストの URL を探す。
+    """
+    m = _CONTEST_HREF_RE.search(html_text)
+    if m:
+        href = m.group(1)
+        return href if href.startswith("http") else f"https://atcoder.jp{href}"
+    m2 = _CONTEST_TEXT_RE.search(html_text)
+    return m2.group(0) if m2 else None
+
+
+def page_title(html_text: str) -> str | None:
+    """<title> のテキスト（末尾の " - AtCoder" は除く）。無ければ None。"""
+    m = _TITLE_RE.search(html_text)
+    if not m:
+        return None
+    title = " ".join(html.unescape(m.group(1)).split())
+    return title.removesuffix(" - AtCoder") or None
@@ -0,0 +1,405 @@
+import asyncio
+import codecs
+import email.utils
+import random
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from metrics import registry
+from singleflight import SingleFlight
+
+USER_AGENT = "AtCoderWatchBot/1.0 (+https://example.local/)"
+
+
+FETCH_SECONDS = registry.histogram(
+    "atcoder_fetch_seconds", "AtCoder への GET の所要時間"
+)
+FETCH_STATUS = registry.counter(
+    "atcoder_fetch_status_total", "AtCoder の応答ステータス"
+)
+FETCH_BYTES = registry.counter(
+    "atcoder_fetch_bytes_total", "AtCoder から受信した本文のバイト数"
+)
+FETCH_RETRIES = registry.counter(
+    "atcoder_fetch_retries_total", "再送とヘッジの回数（kind=retry/hedge）"
+)
+CIRCUIT_REJECTED = registry.counter(
+    "atcoder_circuit_rejected_total", "ブレーカが開いていて送らなかったリクエスト数"
+)
+CIRCUIT_OPEN = registry.gauge(
+    "atcoder_circuit_open", "エンドポイントのブレーカが開いて（半開きも含む）いれば 1"
+)
+
+FETCH_STOPPED = registry.counter(
+    "atcoder_fetch_stopped_total",
+    "本文を最後まで読まずに打ち切った回数（reason=done: 必要な部分を読み終えた / limit: 上限超過）",
+)
+
+# 本文を読む単位（バイト）
+STREAM_CHUNK = 16384
+
+# 再送の対象にする一時的な失敗
+_TRANSIENT_STATUSES = {429, 500, 502, 503, 504}
+# これより長い Retry-After が返ったら、その場では再送しない
+_MAX_RETRY_WAIT = 10.0
+
+
+def _endpoint(url: str) -> str:
+    """メトリクスのラベル用に URL を /home・/posts・/contests などに丸める。"""
+    path = urlsplit(url).path.strip("/")
+    return path.split("/", 1)[0] or "root"
+
+
+def _observe(url: str, started: float, status: int, body: str = ""):
+    endpoint = _endpoint(url)
+    FETCH_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+    FETCH_STATUS.inc(endpoint=endpoint, status=status)
+    if body:
+        FETCH_BYTES.inc(len(body.encode("utf-8")), endpoint=endpoint)
+
+
+def _retry_after_seconds(value: str | None) -> float | None:
+    """Retry-After（秒数または HTTP 日付）を秒数にする。"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class CircuitBreaker:
+    """
+    エンドポイント単位のサーキットブレーカ。一時的な失敗が threshold 回続くと cooldown 秒
+    （Retry-After の方が長ければそちら）のあいだ開き、リクエストを送らずに失敗させる。
+    時間が過ぎたら 1 本だけ試し（half-open）、成功すれば閉じ、失敗すればまた開く。
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.open_until = 0.0
+        self._probe_at = 0.0
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        if self.state == "closed":
+            return True
+        if self.state == "open" and now < self.open_until:
+            return False
+        # 試しの 1 本が返ってこないまま cooldown が過ぎたら、もう 1 本試す
+        if self.state == "half_open" and now - self._probe_at < self.cooldown:
+            return False
+        self.state = "half_open"
+        self._probe_at = now
+        return True
+
+    def remaining(self) -> float:
+        return max(0.0, self.open_until - time.monotonic())
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+
+    def record_failure(self, retry_after: float | None = None):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.threshold:
+            self.state = "open"
+            self.open_until = time.monotonic() + max(self.cooldown, retry_after or 0.0)
+
+
+class RetryBudget:
+    """
+    再送・ヘッジに使えるトークン。リクエストごとに ratio 枚貯まり（max_tokens まで）、
+    1 回の再送・ヘッジで 1 枚使う。相手が不調なときに再送で負荷を何倍にもしないための上限。
+    """
+
+    def __init__(self, ratio: float = 0.2, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+
+    def deposit(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class HttpClient:
+    """
+    Bot 全体で共有する HTTP クライアント。
+    接続プール（keep-alive）・DNS キャッシュ・ホスト毎の同時接続数・UA/タイムアウトを一箇所で管理する。
+    start() / close() は Bot のライフサイクル（setup_hook / close）から呼ぶ。
+    429 / 503 で Retry-After が返ったときは retry_after[url] に待つべき秒数を残す。
+
+    AtCoder への同時リクエストは max_concurrent 本までに抑える。get_text() は同じ URL への
+    同時の GET を 1 本にまとめ、成功した応答は reuse_ttl 秒のあいだ使い回す。
+
+    一時的な失敗（5xx / 429 / 通信エラー・タイムアウト）は retries 回まで揺らぎ付きの指数バックオフで
+    再送する（RetryBudget の範囲内）。エンドポイントごとの CircuitBreaker が開いている間は送らずに
+    503 を返し、retry_after[url] に開いている残り秒数を入れる。
+    group を指定したリクエストは、ブレーカと再送の予算をその名前で別に持つ（埋め戻しのような
+    裏の取得の失敗で、ポーリングのブレーカが開いたり予算を使い切ったりしないように）。
+    hedge=True のリクエストは hedge_after 秒で応答が無ければ同じリクエストをもう 1 本送り、先に返った方を使う。
+
+    本文は STREAM_CHUNK ずつ読みながらデコードする。until に extract の scanner（feed() と done を
+    持つクラス）を渡すと読んだ分を流し込み、done になった時点で残りを読まずに接続を閉じる
+    （返す本文はそこまでの先頭部分）。max_body バイトを超える本文もそこで打ち切る。
+    """
+
+    def __init__(
+        self,
+        timeout: float = 30,
+        limit: int = 32,
+        limit_per_host: int = 8,
+        dns_ttl: int = 300,
+        keepalive: float = 60,
+        user_agent: str = USER_AGENT,
+        max_concurrent: int = 16,
+        reuse_ttl: float = 2.0,
+        retries: int = 2,
+        retry_base: float = 0.5,
+        retry_ratio: float = 0.2,
+        breaker_threshold: int = 5,
+        breaker_cooldown: float = 30.0,
+        hedge_after: float = 2.0,
+        max_body: int = 4 * 1024 * 1024,
+    ):
+        self.timeout = timeout
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive = keepalive
+        self.user_agent = user_agent
+        self._session: aiohttp.ClientSession | None = None
+        self.retry_after: dict[str, float] = {}
+        self._fetch_sem = asyncio.Semaphore(max(1, max_concurrent))
+        self._get_flight = SingleFlight("http_get", ttl=reuse_ttl)
+        self.retries = retries
+        self.retry_base = retry_base
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.hedge_after = hedge_after
+        self.max_body = max_body
+        self.retry_ratio = retry_ratio
+        self._budgets: dict[str | None, RetryBudget] = {None: RetryBudget(retry_ratio)}
+        self._breakers: dict[str, CircuitBreaker] = {}
+
+    async def start(self):
+        if self._session and not self._session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=self.dns_ttl,
+            use_dns_cache=True,
+            keepalive_timeout=self.keepalive,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={"User-Agent": self.user_agent},
+        )
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            raise RuntimeError("HttpClient.start() が呼ばれていません")
+        return self._session
+
+    async def get_text(
+        self, url: str, hedge: bool = False, until=None, group: str | None = None
+    ) -> tuple[int, str]:
+        """GET して (status, 本文) を返す。200 以外は本文を読まず空文字を返す。"""
+        # 途中で打ち切った本文は、別の scanner で読む呼び出しとは分け合わない
+        key = url if until is None and group is None else (url, until, group)
+        status, body, _ = await self._get_flight.do(
+            key, self._request, url, None, hedge, until, group
+        )
+        if status != 200:
+            # 失敗した応答は使い回さない
+            self._get_flight.forget(key)
+        return status, body
+
+    async def get_conditional(
+        self,
+        url: str,
+        etag: str | None = None,
+        last_modified: str | None = None,
+        hedge: bool = False,
+        until=None,
+    ) -> tuple[int, str, dict]:
+        """
+        ETag / Last-Modified を付けた条件付き GET。
+        戻り値: (status, 本文, validators)。304 や 200 以外では本文は空文字。
+        validators は {"etag": ..., "last_modified": ...}（レスポンスに無ければ None）。
+        """
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        return await self._request(url, headers, hedge, until)
+
+    def breaker(self, url: str, group: str | None = None) -> CircuitBreaker:
+        endpoint = group or _endpoint(url)
+        breaker = self._breakers.get(endpoint)
+        if breaker is None:
+            breaker = self._breakers[endpoint] = CircuitBreaker(
+                self.breaker_threshold, self.breaker_cooldown
+            )
+        return breaker
+
+    def _budget(self, group: str | None = None) -> RetryBudget:
+        budget = self._budgets.get(group)
+        if budget is None:
+            budget = self._budgets[group] = RetryBudget(self.retry_ratio)
+        return budget
+
+    async def _request(
+        self,
+        url: str,
+        headers: dict | None,
+        hedge: bool,
+        until=None,
+        group: str | None = None,
+    ) -> tuple[int, str, dict]:
+        endpoint = group or _endpoint(url)
+        breaker = self.breaker(url, group)
+        budget = self._budget(group)
+        budget.deposit()
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                CIRCUIT_REJECTED.inc(endpoint=endpoint)
+                self.retry_after[url] = breaker.remaining() or breaker.cooldown
+                return 503, "", {"etag": None, "last_modified": None}
+            error = None
+            try:
+                if hedge and self.hedge_after > 0:
+                    status, body, validators = await self._hedged(
+                        url, headers, until, budget
+                    )
+                else:
+                    status, body, validators = await self._attempt(url, headers, until)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                FETCH_STATUS.inc(endpoint=endpoint, status="error")
+                error, status = e, None
+            if status is not None and status not in _TRANSIENT_STATUSES:
+                breaker.record_success()
+                CIRCUIT_OPEN.set(0, endpoint=endpoint)
+                return status, body, validators
+
+            retry_after = self.retry_after.get(url) if status is not None else None
+            breaker.record_failure(retry_after)
+            CIRCUIT_OPEN.set(0 if breaker.state == "closed" else 1, endpoint=endpoint)
+            attempt += 1
+            if (
+                attempt > self.retries
+                or breaker.state != "closed"
+                or (retry_after or 0) > _MAX_RETRY_WAIT
+                or not budget.withdraw()
+            ):
+                if error is not None:
+                    raise error
+                return status, body, validators
+            FETCH_RETRIES.inc(endpoint=endpoint, kind="retry")
+            backoff = self.retry_base * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+            await asyncio.sleep(max(backoff, retry_after or 0))
+
+    async def _hedged(
+        self, url: str, headers: dict | None, until=None, budget=None
+    ) -> tuple[int, str, dict]:
+        budget = budget or self._budget()
+        tasks = [asyncio.create_task(self._attempt(url, headers, until))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_after)
+            if not done and budget.withdraw():
+                FETCH_RETRIES.inc(endpoint=_endpoint(url), kind="hedge")
+                tasks.append(asyncio.create_task(self._attempt(url, headers, until)))
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _attempt(
+        self, url: str, headers: dict | None, until=None
+    ) -> tuple[int, str, dict]:
+        async with self._fetch_sem:
+            started = time.perf_counter()
+            async with self.session.get(url, headers=headers) as resp:
+                validators = {
+                    "etag": resp.headers.get("ETag"),
+                    "last_modified": resp.headers.get("Last-Modified"),
+                }
+                body = await self._read(url, resp, until) if resp.status == 200 else ""
+        _observe(url, started, resp.status, body)
+        self._note_retry_after(url, resp)
+        return resp.status, body, validators
+
+    async def _read(self, url: str, resp: aiohttp.ClientResponse, until=None) -> str:
+        """本文を chunk ごとに読んでデコードする。scanner が done になるか max_body を超えたら打ち切る。"""
+        try:
+            decoder = codecs.getincrementaldecoder(resp.charset or "utf-8")("replace")
+        except LookupError:
+            decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        scanner = until() if until is not None else None
+        parts = []
+        size = 0
+        async for chunk in resp.content.iter_chunked(STREAM_CHUNK):
+            if self.max_body and size + len(chunk) > self.max_body:
+                chunk = chunk[: self.max_body - size]
+            size += len(chunk)
+            text = decoder.decode(chunk)
+            parts.append(text)
+            if scanner is not None:
+                try:
+                    scanner.feed(text)
+                except Exception:
+                    # 壊れた HTML は最後まで読んで呼び出し側のパーサに任せる
+                    scanner = None
+                if scanner is not None and scanner.done:
+                    FETCH_STOPPED.inc(endpoint=_endpoint(url), reason="done")
+                    break
+            if self.max_body and size >= self.max_body:
+                FETCH_STOPPED.inc(endpoint=_endpoint(url), reason="limit")
+                print(f"本文が {self.max_body} バイトを超えたので打ち切りました:", url)
+                break
+        else:
+            parts.append(decoder.decode(b"", True))
+        return "".join(parts)
+
+    def _note_retry_after(self, url: str, resp: aiohttp.ClientResponse):
+        if resp.status in (429, 503):
+            seconds = _retry_after_seconds(resp.headers.get("Retry-After"))
+            if seconds is not None:
+                self.retry_after[url] = seconds
+                return
+        self.retry_after.pop(url, None)
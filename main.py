@@ -1,118 +1,544 @@
+import time
+
+# 起動から ready までの計測起点（import の時間も含める）
+_STARTED_AT = time.perf_counter()
+
 import discord
 from discord.ext import commands
 from discord import app_commands
 import os
 from dotenv import load_dotenv
-import aiohttp
 import asyncio
 import hashlib
+import json
 import pathlib
-from bs4 import BeautifulSoup
-import html
-import re
-
-from markdownify import markdownify as md
-
-
-def _find_contest_panel(soup: BeautifulSoup):
-    """『直近のコンテストの告知』パネルを探す。見出しテキストやidを手がかりに柔軟に探索する。"""
-    for div in soup.find_all("div"):
-        classes = div.get("class") or []
-        if "panel" in classes:
-
-            heading = div.find(
-                lambda tag: tag.name in ("h1", "h2", "h3")
-                and tag.get_text()
-                and "直近のコンテストの告知" in tag.get_text()
-            )
-            if heading:
-                return div
-
-    panel = soup.find("div", id="contest-table-upcoming")
-    if panel:
-        return panel
-
-    text_node = soup.find(string=lambda s: s and "直近のコンテストの告知" in s)
-    if text_node and hasattr(text_node, "parent"):
-        return text_node.parent
-
-    return None
 
+import extract
+import metrics
+import parsing
+import render
+from archive import Archive, Backfill
+from classify import classifier
+from cluster import (
+    LeaderLock,
+    ShardIPC,
+    decode_message,
+    encode_message,
+    shard_for_guild,
+)
+from delivery import Deliverer
+from digest import DigestQueue, pack_pages
+from http_client import HttpClient
+from parse_pool import LoopLagMonitor, ParsePool
+from poll_scheduler import PollScheduler
+from post_cache import PostCache
+from records import Post
+from reminders import ReminderScheduler
+from series_index import SeriesIndex
+from singleflight import SingleFlight
+from state_store import FAILED, PENDING, SENT, StateStore
+from subscriptions import ALL_SERIES, SubscriptionRegistry
+from timetable import ContestTimetable
 
 load_dotenv()
 
 intents = discord.Intents.default()
 intents.message_content = True
 
-bot = commands.Bot(command_prefix="!", intents=intents)
+# シャード構成: SHARD_COUNT を指定すると AutoShardedBot で動き、SHARD_IDS のシャードを担当する
+# （省略時は全シャード）。ポーリングはロックを取った 1 プロセスだけが行う
+SHARD_COUNT = int(os.getenv("SHARD_COUNT") or 0)
+SHARD_IDS = [
+    int(x) for x in os.getenv("SHARD_IDS", "").split(",") if x.strip().isdigit()
+] or None
+OWNED_SHARDS = set(SHARD_IDS or range(SHARD_COUNT))
+
+
+class AtCoderBot(commands.AutoShardedBot if SHARD_COUNT else commands.Bot):
+    """共有 HTTP クライアントと解析ワーカーのライフサイクルを Bot に紐付ける。"""
+
+    async def setup_hook(self):
+        await http.start()
+        loop_lag.start()
+        deliverer.start()
+        if SHARD_COUNT:
+            await shard_ipc.start()
+        if METRICS_PORT:
+            self._metrics_runner = await metrics.serve(METRICS_HOST, METRICS_PORT)
+        if METRICS_JSON_PATH:
+            self._metrics_dump = asyncio.create_task(
+                metrics.dump_loop(
+                    pathlib.Path(METRICS_JSON_PATH), METRICS_DUMP_INTERVAL
+                )
+            )
+
+    async def close(self):
+        loop_lag.stop()
+        deliverer.stop()
+        digest_queue.stop()
+        reminder_scheduler.stop()
+        if SHARD_COUNT:
+            await shard_ipc.stop()
+        _flush_state()
+        leader_lock.release()
+        if getattr(self, "_metrics_dump", None):
+            self._metrics_dump.cancel()
+        if getattr(self, "_metrics_runner", None):
+            await self._metrics_runner.cleanup()
+        await http.close()
+        parse_pool.shutdown()
+        await super().close()
+
+
+if SHARD_COUNT:
+    bot = AtCoderBot(
+        command_prefix="!",
+        intents=intents,
+        shard_count=SHARD_COUNT,
+        shard_ids=SHARD_IDS,
+    )
+else:
+    bot = AtCoderBot(command_prefix="!", intents=intents)
 client = bot
 
 ATCODER_URL = os.getenv("ATCODER_URL", "https://atcoder.jp/home?lang=ja")
 POLL_INTERVAL = int(os.getenv("POLL_INTERVAL", "300"))
-LAST_HASH_FILE = pathlib.Path(__file__).parent / ".last_atcoder_hash"
+# 状態ファイル・キャッシュの置き場所（既定は main.py と同じディレクトリ）
+STATE_DIR = pathlib.Path(os.getenv("STATE_DIR") or pathlib.Path(__file__).parent)
+# ポーラーの状態（処理済み投稿・配信記録・validators）と投稿キャッシュ・配信先を置く SQLite
+STATE_FILE = STATE_DIR / ".atcoder_state.sqlite3"
+# 旧形式の状態ファイル（起動時に STATE_FILE へ移行する）
+LAST_HASH_FILE = STATE_DIR / ".last_atcoder_hash"
+# 処理済みとして覚えておく投稿 ID の数（古いものから忘れる）
+SEEN_POSTS_LIMIT = int(os.getenv("SEEN_POSTS_LIMIT", "1000"))
+# 送信済み・失敗の配信記録を残しておく日数（送信途中の記録は送り直すまで残す）
+DELIVERY_RETENTION_DAYS = float(os.getenv("DELIVERY_RETENTION_DAYS", "30"))
+# 条件付き GET（ETag / If-Modified-Since）で /home をポーリングする
+CONDITIONAL_POLL = os.getenv("CONDITIONAL_POLL", "true").lower() in ("1", "true", "yes")
+POLL_STATS_LOG_EVERY = int(os.getenv("POLL_STATS_LOG_EVERY", "12"))
 TARGET_CHANNEL_ID = os.getenv("TARGET_CHANNEL_ID")
+# 起動時テスト送信がポーラーの最初の /home 解析を待つ秒数（過ぎたら自分で取得する）
+STARTUP_PANEL_WAIT = float(os.getenv("STARTUP_PANEL_WAIT", "30"))
 SEND_LATEST_ON_STARTUP = os.getenv("SEND_LATEST_ON_STARTUP", "false").lower() in (
     "1",
     "true",
     "yes",
 )
 CONTESTS_URL = os.getenv("CONTESTS_URL", "https://atcoder.jp/contests/?lang=ja")
+# 予定表と告知の検知履歴からポーリング間隔を調整する（false なら POLL_INTERVAL 固定）
+ADAPTIVE_POLL = os.getenv("ADAPTIVE_POLL", "true").lower() in ("1", "true", "yes")
+# /contests/ の時刻表を読み直す間隔
+CONTESTS_REFRESH = float(os.getenv("CONTESTS_REFRESH", "3600"))
 # 即時反映用（任意）：開発用ギルドIDを指定するとギルド単位で同期して即時反映
 GUILD_ID = os.getenv("GUILD_ID")
+# コマンドツリーが前回の同期から変わっていなくても同期する
+FORCE_COMMAND_SYNC = os.getenv("FORCE_COMMAND_SYNC", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
 GUILD_OBJ = (
     discord.Object(id=int(GUILD_ID)) if GUILD_ID and GUILD_ID.isdigit() else None
 )
 
-SERIES_ALIASES = {
-    "ABC": "abc",
-    "ARC": "arc",
-    "AGC": "agc",
-    "AHC": "ahc",
+# シリーズの判定ルール（classify.py の表。SERIES_RULES で追加・上書き）から作る
+SERIES_ALIASES = {name.upper(): name for name in classifier.names}
+_SERIES_CHOICES = "/".join(classifier.names)
+
+# シリーズ毎のメンションロール（ABC_ROLE_ID, ARC_ROLE_ID, ADT_ROLE_ID など）
+SERIES_ROLE_IDS = {
+    sp: int(os.getenv(f"{key}_ROLE_ID"))
+    for key, sp in SERIES_ALIASES.items()
+    if (os.getenv(f"{key}_ROLE_ID") or "").isdigit()
 }
 
-ABC_ROLE_ID = os.getenv("ABC_ROLE_ID")
 
+def _parse_offsets(spec: str) -> list[int]:
+    """'1d,1h,10m' のような指定を秒数のリスト（大きい順）にする。"""
+    units = {"d": 86400, "h": 3600, "m": 60, "s": 1}
+    offsets = set()
+    for part in spec.split(","):
+        part = part.strip().lower()
+        if part[:-1].isdigit() and part[-1] in units:
+            offsets.add(int(part[:-1]) * units[part[-1]])
+        elif part.isdigit():
+            offsets.add(int(part))
+    return sorted(offsets, reverse=True)
+
+
+# コンテスト開始前のリマインダ（既定は空 = 送らない。例: "1d,1h,10m"）
+# 停止中に過ぎた分は REMINDER_GRACE 秒までなら送る
+REMINDER_OFFSETS = _parse_offsets(os.getenv("REMINDER_OFFSETS", ""))
+REMINDER_GRACE = float(os.getenv("REMINDER_GRACE", "120"))
+
+# /contest-info で投稿ページを並列取得する際の同時取得数と走査上限
+SERIES_SCAN_CONCURRENCY = int(os.getenv("SERIES_SCAN_CONCURRENCY", "6"))
+SERIES_SCAN_LIMIT = int(os.getenv("SERIES_SCAN_LIMIT", "40"))
+
+# 共有 HTTP クライアント（接続プール・DNS キャッシュ・ホスト毎の同時接続上限）
+http = HttpClient(
+    timeout=float(os.getenv("HTTP_TIMEOUT", "30")),
+    limit_per_host=int(os.getenv("HTTP_LIMIT_PER_HOST", "8")),
+    dns_ttl=int(os.getenv("HTTP_DNS_TTL", "300")),
+    keepalive=float(os.getenv("HTTP_KEEPALIVE", "60")),
+    max_concurrent=int(os.getenv("HTTP_MAX_CONCURRENT", "16")),
+    reuse_ttl=float(os.getenv("HTTP_REUSE_TTL", "2")),
+    retries=int(os.getenv("HTTP_RETRIES", "2")),
+    breaker_threshold=int(os.getenv("HTTP_BREAKER_THRESHOLD", "5")),
+    breaker_cooldown=float(os.getenv("HTTP_BREAKER_COOLDOWN", "30")),
+    # /home は hedge_after 秒で応答が無ければもう 1 本送る
+    hedge_after=float(os.getenv("HTTP_HEDGE_AFTER", "2")),
+    max_body=int(os.getenv("HTTP_MAX_BODY", str(4 * 1024 * 1024))),
+)
 
-def _extract_contest_slug(url: str) -> str:
-    """contest URL からスラッグ (abc420 等) を抽出"""
-    if not url:
-        return ""
-    m = re.search(r"/contests/([a-zA-Z0-9_\-]+)/?", url)
-    return m.group(1).lower() if m else ""
+state_store = StateStore(
+    STATE_FILE,
+    max_seen=SEEN_POSTS_LIMIT,
+    delivery_retention=DELIVERY_RETENTION_DAYS * 86400,
+)
 
+# 解析済み投稿のキャッシュ（LRU + TTL、SQLite に永続化）
+post_cache = PostCache(
+    STATE_FILE,
+    max_entries=int(os.getenv("POST_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("POST_CACHE_TTL", str(7 * 24 * 3600))),
+)
 
-def _abs_url(href: str) -> str:
-    return href if href.startswith("http") else f"https://atcoder.jp{href}"
+# 過去のコンテスト告知のアーカイブ（/search はここだけを引く）。ポーリングで読んだ告知も入れる
+archive = Archive(STATE_FILE)
+# ARCHIVE_BACKFILL=true なら起動時に投稿 ID を遡って埋め戻す（既定は無効）
+# ARCHIVE_CONCURRENCY 件ずつ、1 秒に ARCHIVE_RATE 件まで
+ARCHIVE_BACKFILL = os.getenv("ARCHIVE_BACKFILL", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+# 埋め戻しが取得に失敗したときにやり直すまでの秒数
+ARCHIVE_RETRY = float(os.getenv("ARCHIVE_RETRY", "600"))
+ARCHIVE_SEARCH_LIMIT = int(os.getenv("ARCHIVE_SEARCH_LIMIT", "10"))
+
+poll_scheduler = PollScheduler(
+    base=POLL_INTERVAL,
+    min_interval=float(os.getenv("POLL_MIN_INTERVAL", "30")),
+    max_interval=float(os.getenv("POLL_MAX_INTERVAL", "1800")),
+    jitter=float(os.getenv("POLL_JITTER", "0.1")),
+    hot_before=float(os.getenv("POLL_HOT_BEFORE", "900")),
+    hot_after=float(os.getenv("POLL_HOT_AFTER", "1800")),
+    hour_weights=json.loads(state_store.get("announce_hours") or "null"),
+)
+
+# 開催中・予定されたコンテストの時刻表（/contests/ を CONTESTS_REFRESH 秒ごとに差分更新）
+timetable = ContestTimetable()
+_timetable_validators: dict = {}
+# 前回の時刻表から復元し、起動直後からリマインダを組めるようにする
+if state_store.get("timetable"):
+    timetable.restore(json.loads(state_store.get("timetable")))
+
+# シリーズ → 直近の告知 の索引（ポーリングループが差分更新する）
+series_index = SeriesIndex()
+# 前回の索引を復元しておき、作り直すまでの /contest-info に即答する（stale-while-revalidate）
+if state_store.get("series_index"):
+    series_index.restore(json.loads(state_store.get("series_index")))
+# 直近の /home 解析で得たパネルのリンク（起動時テスト送信が再取得せずに使う）
+_panel_links: list[tuple[str, str]] | None = None
+_panel_ready = asyncio.Event()
+
+# HTML 解析・Markdown 変換はイベントループ外のワーカーで行う（thread / process）
+parse_pool = ParsePool(
+    kind=os.getenv("PARSE_EXECUTOR", "thread").lower(),
+    workers=int(os.getenv("PARSE_WORKERS", "2")),
+)
+# イベントループのブロック時間の計測
+loop_lag = LoopLagMonitor(
+    warn_after=float(os.getenv("LOOP_LAG_WARN_MS", "250")) / 1000,
+)
+
+# メトリクスの公開先: METRICS_PORT で HTTP（/metrics, /metrics.json）、METRICS_JSON_PATH で定期ダンプ
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT") or 0)
+METRICS_JSON_PATH = os.getenv("METRICS_JSON_PATH")
+METRICS_DUMP_INTERVAL = float(os.getenv("METRICS_DUMP_INTERVAL", "60"))
+# /contest-info の呼び出しごとのスパンを記録する
+metrics.registry.tracing = os.getenv("METRICS_TRACE", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+DISCORD_SEND_SECONDS = metrics.registry.histogram(
+    "discord_send_seconds", "Discord へのメッセージ送信の所要時間"
+)
+POLL_TICK_LAG_SECONDS = metrics.registry.histogram(
+    "poll_loop_lag_seconds", "ポーリングが予定時刻より遅れて始まった時間"
+)
+STARTUP_SECONDS = metrics.registry.gauge(
+    "startup_seconds", "プロセス起動から ready までの秒数"
+)
+SERIES_LOOKUPS = metrics.registry.counter(
+    "series_lookup_total", "/contest-info の索引参照（result=hit/miss/stale/crawl）"
+)
+metrics.registry.gauge(
+    "post_cache_hits", "投稿キャッシュのヒット数", fn=lambda: post_cache.hits
+)
+metrics.registry.gauge("archive_posts", "アーカイブ済みの告知数", fn=archive.count)
+metrics.registry.gauge(
+    "post_cache_misses", "投稿キャッシュのミス数", fn=lambda: post_cache.misses
+)
+metrics.registry.gauge(
+    "render_memo_hits", "Markdown メモのヒット数", fn=lambda: render.stats["hits"]
+)
+metrics.registry.gauge(
+    "render_memo_misses", "Markdown メモのミス数", fn=lambda: render.stats["misses"]
+)
+
+
+# 条件付きポーリングの統計（304 の回数・省略したパース回数・節約できた推定バイト数）
+POLL_STATS = {"requests": 0, "not_modified": 0, "skipped_parses": 0, "bytes_saved": 0}
+for _name in POLL_STATS:
+    metrics.registry.gauge(
+        f"poll_{_name}",
+        f"条件付きポーリングの {_name}",
+        fn=lambda k=_name: POLL_STATS[k],
+    )
 
 
-def _find_contest_url(node: BeautifulSoup) -> str | None:
+def _read_last_state() -> dict:
+    """前回の状態（contest:ID / hash:H）と条件付き GET 用の validators・前回本文の長さ。メモリから返す。"""
+    length = state_store.get("length")
+    return {
+        "state": state_store.get("state", ""),
+        "etag": state_store.get("etag"),
+        "last_modified": state_store.get("last_modified"),
+        "length": int(length) if length else 0,
+    }
+
+
+def _write_last_state(
+    value: str, validators: dict | None = None, length: int | None = None
+):
     """
-    指定ノード内から /contests/{slug} のURLを抽出して返す（ルート /contests/ は除外）。
-    まず <a> の href を走査、なければプレーンテキストのURLを検索。
+    状態を更新する。validators / length を省略した場合は保存済みの値を引き継ぐ。
+    変わった値だけが _flush_state() でまとめて書き込まれる。
     """
-    # 1) aタグのhrefを優先（出現順）
-    for a in node.find_all("a", href=True):
-        h = a["href"]
-        m = re.search(r"/contests/([A-Za-z0-9_\-]+)/?", h)
-        if m:
-            return _abs_url(h)
-    # 2) プレーンテキストから抽出
-    text = node.get_text(" ", strip=True)
-    m2 = re.search(r"https?://atcoder\.jp/contests/([A-Za-z0-9_\-]+)/?", text)
-    if m2:
-        return m2.group(0)
-    return None
+    state_store.set("state", value)
+    if validators is not None:
+        state_store.set("etag", validators.get("etag"))
+        state_store.set("last_modified", validators.get("last_modified"))
+    if length is not None:
+        state_store.set("length", length or None)
+
+
+def _flush_state():
+    state_store.flush()
+    post_cache.flush()
+
+
+def _migrate_last_hash_file():
+    """旧形式の LAST_HASH_FILE（1 行目が状態、以降 etag: / last-modified: / length:）を取り込む。"""
+    if not LAST_HASH_FILE.exists() or state_store.get("state"):
+        return
+    lines = LAST_HASH_FILE.read_text().splitlines()
+    validators = {"etag": None, "last_modified": None}
+    length = None
+    for line in lines[1:]:
+        key, _, value = line.partition(":")
+        value = value.strip()
+        if key == "etag":
+            validators["etag"] = value or None
+        elif key == "last-modified":
+            validators["last_modified"] = value or None
+        elif key == "length" and value.isdigit():
+            length = int(value)
+    _write_last_state(lines[0].strip() if lines else "", validators, length)
+    state_store.flush()
+    LAST_HASH_FILE.unlink()
+    print("状態ファイルを移行しました:", STATE_FILE)
+
+
+_migrate_last_hash_file()
+
+
+def _sha256_hex(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _log_poll_stats():
+    if POLL_STATS_LOG_EVERY > 0 and POLL_STATS["requests"] % POLL_STATS_LOG_EVERY == 0:
+        print(
+            "ポーリング統計: requests={requests} not_modified={not_modified} "
+            "skipped_parses={skipped_parses} bytes_saved={bytes_saved}".format(
+                **POLL_STATS
+            )
+        )
+        print(
+            "解析ワーカー: tasks={tasks} busy={busy_seconds:.2f}s max={max_seconds:.2f}s / "
+            "ループブロック: total={blocked_seconds:.2f}s max={max_lag:.3f}s "
+            "over={over_threshold}".format(**parse_pool.stats, **loop_lag.stats)
+        )
+
+
+async def _send(channel, *args, **kwargs):
+    """channel.send の所要時間を記録して送信する。"""
+    with DISCORD_SEND_SECONDS.time():
+        return await channel.send(*args, **kwargs)
+
+
+def _post_embeds(title: str, post_url: str, text: str | None) -> list[discord.Embed]:
+    """
+    本文を切り詰めずにページに分け、先頭のページにタイトルを付けた embed の並びにする。
+    本文が無くても（未変換・空の本文）タイトルと投稿へのリンクだけの embed を 1 つ返す。
+    """
+    pages = render.split_text(text or "") or [None]
+    embeds = []
+    for i, page in enumerate(pages):
+        if i == 0:
+            embed = discord.Embed(title=title, url=post_url, description=page)
+        else:
+            embed = discord.Embed(description=page)
+        if len(pages) > 1:
+            embed.set_footer(text=f"{i + 1}/{len(pages)}")
+        embeds.append(embed)
+    return embeds
+
+
+async def _send_pages(channel, content: str, embeds: list[discord.Embed]):
+    """embed が 1 通に収まらなければ複数のメッセージに分けて送る。"""
+    for lines, page_embeds, _ in pack_pages([(content, embeds)]):
+        await _send(channel, content="\n".join(lines) or None, embeds=page_embeds)
+
+
+async def _resolve_channel(channel_id: int):
+    """キャッシュに無ければ API から取得する。見つからなければ None。"""
+    channel = client.get_channel(channel_id)
+    if channel is None:
+        try:
+            channel = await client.fetch_channel(channel_id)
+        except Exception:
+            channel = None
+    return channel
+
+
+# 配信先の登録簿。TARGET_CHANNEL_ID / *_ROLE_ID は既定の配信先として扱う
+subscriptions = SubscriptionRegistry(STATE_FILE)
+if TARGET_CHANNEL_ID and TARGET_CHANNEL_ID.isdigit():
+    subscriptions.add_default(int(TARGET_CHANNEL_ID))
+    for _series, _role_id in SERIES_ROLE_IDS.items():
+        subscriptions.add_default(int(TARGET_CHANNEL_ID), _series, _role_id)
+
+# 全配信先への並列送信（チャンネル毎のレート制限と有限長キューでの再送）
+deliverer = Deliverer(
+    _resolve_channel,
+    _send,
+    workers=int(os.getenv("DELIVERY_WORKERS", "8")),
+    queue_size=int(os.getenv("DELIVERY_QUEUE_SIZE", "1000")),
+    max_attempts=int(os.getenv("DELIVERY_MAX_ATTEMPTS", "4")),
+)
+
+
+async def _route_deliver(messages: dict[int, dict]) -> dict[int, bool]:
+    """
+    シャード構成では、他のプロセスが担当するギルド宛ての配信をそのプロセスへ渡す。
+    渡せなければ自分で送る（REST での送信はどのシャードからでもできる）。
+    """
+    if not SHARD_COUNT:
+        return await deliverer.deliver(messages)
+    local: dict[int, dict] = {}
+    remote: dict[int, dict[int, dict]] = {}
+    for channel_id, kwargs in messages.items():
+        shard_id = _shard_for_channel(channel_id)
+        if shard_id is None or shard_id in OWNED_SHARDS:
+            local[channel_id] = kwargs
+        else:
+            remote.setdefault(shard_id, {})[channel_id] = kwargs
+    results: dict[int, bool] = {}
+    for part in await asyncio.gather(
+        deliverer.deliver(local),
+        *(_deliver_remote(shard_id, part) for shard_id, part in remote.items()),
+    ):
+        results.update(part)
+    return results
+
+
+def _shard_for_channel(channel_id: int) -> int | None:
+    guild_id = subscriptions.guild_of(channel_id)
+    if guild_id is None:
+        channel = client.get_channel(channel_id)
+        guild_id = channel.guild.id if getattr(channel, "guild", None) else None
+    return shard_for_guild(guild_id, SHARD_COUNT) if guild_id else None
 
 
-def _role_mention_for_contest(url: str) -> str:
-    """コンテストURLからシリーズを判定し、該当すればロールメンション文字列を返す"""
-    slug = _extract_contest_slug(url)
-    print(url)
-    if slug.startswith("abc") and ABC_ROLE_ID and ABC_ROLE_ID.isdigit():
-        print("abc match")
-        return f"<@&{ABC_ROLE_ID}> "
-    print(slug.startswith("abc"), ABC_ROLE_ID, ABC_ROLE_ID and ABC_ROLE_ID.isdigit())
-    return ""
+async def _deliver_remote(shard_id: int, messages: dict[int, dict]) -> dict[int, bool]:
+    try:
+        response = await shard_ipc.request(
+            shard_id,
+            {
+                "op": "deliver",
+                "messages": {
+                    str(channel_id): encode_message(kwargs)
+                    for channel_id, kwargs in messages.items()
+                },
+            },
+        )
+        return {int(k): v for k, v in response["results"].items()}
+    except Exception as e:
+        print(f"shard {shard_id} へ渡せませんでした。自分で送ります:", e)
+        return await deliverer.deliver(messages)
+
+
+async def _handle_ipc(message: dict) -> dict:
+    """ポーラーのプロセスから渡された配信を送る。"""
+    if message.get("op") != "deliver":
+        return {"error": f"unknown op: {message.get('op')}"}
+    results = await deliverer.deliver(
+        {
+            int(channel_id): decode_message(data)
+            for channel_id, data in message["messages"].items()
+        }
+    )
+    return {"results": {str(k): v for k, v in results.items()}}
+
+
+shard_ipc = ShardIPC(
+    pathlib.Path(os.getenv("SHARD_IPC_DIR") or STATE_DIR), OWNED_SHARDS, _handle_ipc
+)
+# シャード構成でポーラーを決めるロック。取れなかったプロセスは LEADER_RETRY 秒ごとに取り直す
+leader_lock = LeaderLock(STATE_DIR / ".atcoder_poller.lock")
+LEADER_RETRY = float(os.getenv("LEADER_RETRY", "30"))
+# ポーラーでないプロセスが共有 DB の時刻表・シリーズ索引を読み直す間隔
+FOLLOWER_REFRESH = float(os.getenv("FOLLOWER_REFRESH", "30"))
+# チャンネルごとに DIGEST_WINDOW 秒のあいだの告知・リマインダを 1 通にまとめる
+digest_queue = DigestQueue(
+    _route_deliver, window=float(os.getenv("DIGEST_WINDOW", "2"))
+)
+
+
+async def _load_post(
+    post_url: str, title: str, need_text: bool = False, render_if=None
+) -> Post | None:
+    """
+    投稿をキャッシュから返す。無ければ（または本文が必要なのに未レンダリングなら）取得して解析する。
+    render_if(entry) が True を返す投稿も本文まで変換する（スラッグを見てから決めたい場合用）。
+    取得に失敗した場合は None。通信エラーは呼び出し側に送出する。
+    """
+    entry = post_cache.get(parsing.post_id(post_url))
+    if entry is not None:
+        wanted = need_text or (render_if is not None and render_if(entry))
+        if entry.text is not None or not wanted or not entry.is_contest:
+            return entry
+
+    status, post_html = await http.get_text(post_url, until=extract.BodyScanner)
+    if status != 200:
+        print("投稿ページ取得失敗 status=", status)
+        return None
+    entry = await parse_pool.run(
+        parsing.parse_post, post_url, title, post_html, need_text
+    )
+    if entry.text is None and render_if is not None and render_if(entry):
+        entry = await parse_pool.run(
+            parsing.parse_post, post_url, title, post_html, True
+        )
+    post_cache.put(entry)
+    archive.add(entry)
+    return entry
 
 
 _ALLOWED_CHANNEL_IDS_ENV = os.getenv("ALLOWED_CHANNEL_IDS", "").strip()
@@ -123,11 +549,36 @@ ALLOWED_CHANNEL_IDS = {
 }
 
 
-@client.event
-async def on_ready():
+def _command_tree_hash() -> str:
+    """同期対象のコマンド定義（名前・説明・引数など）のハッシュ。"""
+    commands_json = [
+        command.to_dict(client.tree)
+        for command in client.tree.get_commands(guild=GUILD_OBJ)
+    ]
+    payload = {
+        "application_id": client.application_id,
+        "guild_id": GUILD_OBJ.id if GUILD_OBJ else None,
+        "commands": commands_json,
+    }
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+
+
+async def _sync_commands():
+    """
+    コマンドツリーを同期する。前回同期したときとハッシュが同じなら何もしない
+    （デプロイのたびに同期して Discord のレート制限に当たらないように）。
+    """
+    if GUILD_OBJ:
+        client.tree.copy_global_to(guild=GUILD_OBJ)
+    tree_hash = _command_tree_hash()
+    if not FORCE_COMMAND_SYNC and state_store.get("command_tree_hash") == tree_hash:
+        print("Slash commands unchanged; sync skipped")
+        return
+    started = time.perf_counter()
     try:
         if GUILD_OBJ:
-            client.tree.copy_global_to(guild=GUILD_OBJ)
             await client.tree.sync(guild=GUILD_OBJ)
             print(f"Slash commands synced for guild {GUILD_ID}")
         else:
@@ -135,17 +586,83 @@ async def on_ready():
             print("Slash commands synced (global)")
     except Exception as e:
         print("Slash command sync failed:", e)
+        return
+    state_store.set("command_tree_hash", tree_hash)
+    _flush_state()
+    print(f"コマンド同期: {time.perf_counter() - started:.2f}s")
 
+
+@client.event
+async def on_ready():
     if getattr(client, "_atcoder_tasks_started", False):
         return
     client._atcoder_tasks_started = True
 
+    ready_seconds = time.perf_counter() - _STARTED_AT
+    STARTUP_SECONDS.set(ready_seconds)
     print(f"{client.user.name}がログインしました")
     print(f"Bot ID: {client.user.id}")
+    print(f"起動から ready まで {ready_seconds:.2f}s")
     print("------")
+    client.loop.create_task(_run_poller())
+
+
+async def _run_poller():
+    """
+    ポーリング・リマインダ・コマンド同期を始める。シャード構成ではロックを取れた
+    1 プロセスだけが行い、他のプロセスは配信の受け手として待機しつつロックを取り直す。
+    """
+    if SHARD_COUNT:
+        if not leader_lock.try_acquire():
+            follower = asyncio.create_task(_follow_leader())
+            while not leader_lock.try_acquire():
+                await asyncio.sleep(LEADER_RETRY)
+            follower.cancel()
+        print(f"ポーラーに選出されました (shards={sorted(OWNED_SHARDS)})")
+        _take_over_state()
+    # 同期はポーリングの開始を待たせないよう裏で行う
+    client.loop.create_task(_sync_commands())
+    reminder_scheduler.start()
+    _schedule_reminders()
     if SEND_LATEST_ON_STARTUP:
         client.loop.create_task(send_saved_post_on_startup())
-    client.loop.create_task(check_atcoder_loop())
+    if ARCHIVE_BACKFILL:
+        client.loop.create_task(_run_backfill())
+    await _resume_then_poll()
+
+
+def _take_over_state():
+    """前のポーラーが DB に残した状態を読み直す。"""
+    state_store.reload()
+    if state_store.get("announce_hours"):
+        poll_scheduler.hour_weights = json.loads(state_store.get("announce_hours"))
+    _load_shared_snapshots()
+    # 索引は自分のポーリングで作り直す（それまでは読み込んだ索引で即答して裏で取り直す）
+    series_index.ready = False
+
+
+def _load_shared_snapshots():
+    """ポーラーが DB に残した時刻表とシリーズ索引を読み込む。"""
+    if state_store.get("timetable"):
+        timetable.restore(json.loads(state_store.get("timetable")))
+    if state_store.get("series_index"):
+        series_index.restore(json.loads(state_store.get("series_index")))
+
+
+async def _follow_leader():
+    """
+    ポーラーでないプロセスは AtCoder を取得しない。/contests と /contest-info には
+    ポーラーが共有 DB に書いた時刻表・シリーズ索引で答え、DB に書き込みがあれば
+    FOLLOWER_REFRESH 秒ごとに読み直す（ロックを取ってポーラーになるまで続ける）。
+    """
+    series_index.ready = True
+    while True:
+        await asyncio.sleep(FOLLOWER_REFRESH)
+        try:
+            if state_store.reload_if_changed():
+                _load_shared_snapshots()
+        except Exception as e:
+            print("共有状態の読み直しエラー:", e)
 
 
 # @client.tree.command(name="recent_contest", description="直近のコンテストを告知します")
@@ -167,15 +684,16 @@ async def on_ready():
 
 
 @client.tree.command(
-    name="contest-info", description="直近のコンテスト告知を送ります（abc/arc/agc/ahc）"
+    name="contest-info",
+    description=f"直近のコンテスト告知を送ります（{_SERIES_CHOICES}）",
 )
-@app_commands.describe(series="abc / arc / agc / ahc のいずれか")
+@app_commands.describe(series=f"{_SERIES_CHOICES} のいずれか")
 async def slash_latest_series(interaction: discord.Interaction, series: str):
     key = series.upper()
     sp = SERIES_ALIASES.get(key)
     if not sp:
         await interaction.response.send_message(
-            "シリーズは abc/arc/agc/ahc から指定してください。", ephemeral=True
+            f"シリーズは {_SERIES_CHOICES} から指定してください。", ephemeral=True
         )
         return
     if ALLOWED_CHANNEL_IDS:
@@ -188,10 +706,176 @@ async def slash_latest_series(interaction: discord.Interaction, series: str):
                 "このチャンネルでは使用できません。", ephemeral=True
             )
             return
-    await interaction.response.defer(thinking=True)
-    await send_series_announcement(sp, interaction.channel)
-    await interaction.followup.send(
-        f"{series.upper()} の告知を送信しました。", ephemeral=True
+    with metrics.registry.span("contest-info", series=sp) as span:
+        await interaction.response.defer(thinking=True)
+        span.mark("defer")
+        await send_series_announcement(sp, interaction.channel, span)
+        await interaction.followup.send(
+            f"{series.upper()} の告知を送信しました。", ephemeral=True
+        )
+        span.mark("followup")
+
+
+CONTESTS_LIST_LIMIT = 10
+
+
+@client.tree.command(
+    name="contests", description="開催中・予定されたコンテストを表示します"
+)
+@app_commands.describe(series=f"{_SERIES_CHOICES}（省略時はすべて）")
+async def slash_contests(interaction: discord.Interaction, series: str = None):
+    sp = None
+    if series:
+        sp = SERIES_ALIASES.get(series.upper())
+        if not sp:
+            await interaction.response.send_message(
+                f"シリーズは {_SERIES_CHOICES} から指定してください。", ephemeral=True
+            )
+            return
+    if ALLOWED_CHANNEL_IDS:
+        ch_id = getattr(interaction.channel, "id", None)
+        parent_id = getattr(interaction.channel, "parent_id", None)
+        if (ch_id not in ALLOWED_CHANNEL_IDS) and (
+            parent_id not in ALLOWED_CHANNEL_IDS
+        ):
+            await interaction.response.send_message(
+                "このチャンネルでは使用できません。", ephemeral=True
+            )
+            return
+    if not timetable.ready:
+        await interaction.response.send_message(
+            "コンテスト予定表をまだ読み込んでいません。しばらくしてから試してください。",
+            ephemeral=True,
+        )
+        return
+    contests = timetable.upcoming(sp, limit=CONTESTS_LIST_LIMIT)
+    label = sp.upper() if sp else "AtCoder"
+    if not contests:
+        await interaction.response.send_message(
+            f"予定されている {label} のコンテストはありません。", ephemeral=True
+        )
+        return
+    lines = []
+    for c in contests:
+        start = int(c.start)
+        rated = f" / Rated: {c.rated}" if c.rated else ""
+        lines.append(
+            f"<t:{start}:f>（<t:{start}:R>）\n"
+            f"[{c.title}](https://atcoder.jp/contests/{c.slug}) "
+            f"{c.duration // 60}分{rated}"
+        )
+    embed = discord.Embed(
+        title=f"{label} のコンテスト予定", description="\n".join(lines)
+    )
+    await interaction.response.send_message(embed=embed)
+
+
+@client.tree.command(name="search", description="過去のコンテスト告知を検索します")
+@app_commands.describe(
+    query="キーワード・コンテスト ID（abc400 など。空白区切りですべてを含むもの）",
+    series=f"{_SERIES_CHOICES}（省略時はすべて）",
+)
+async def slash_search(
+    interaction: discord.Interaction, query: str = None, series: str = None
+):
+    sp = None
+    if series:
+        sp = SERIES_ALIASES.get(series.upper())
+        if not sp:
+            await interaction.response.send_message(
+                f"シリーズは {_SERIES_CHOICES} から指定してください。", ephemeral=True
+            )
+            return
+    if not (query or "").strip() and not sp:
+        await interaction.response.send_message(
+            "キーワードかシリーズを指定してください。", ephemeral=True
+        )
+        return
+    if ALLOWED_CHANNEL_IDS:
+        ch_id = getattr(interaction.channel, "id", None)
+        parent_id = getattr(interaction.channel, "parent_id", None)
+        if (ch_id not in ALLOWED_CHANNEL_IDS) and (
+            parent_id not in ALLOWED_CHANNEL_IDS
+        ):
+            await interaction.response.send_message(
+                "このチャンネルでは使用できません。", ephemeral=True
+            )
+            return
+    # 通信はせず、手元のアーカイブだけを引く
+    results = archive.search(query, sp, limit=ARCHIVE_SEARCH_LIMIT)
+    label = " ".join(x for x in ((query or "").strip(), sp.upper() if sp else "") if x)
+    if not results:
+        await interaction.response.send_message(
+            f"「{label}」に一致する告知は見つかりませんでした。", ephemeral=True
+        )
+        return
+    lines = []
+    for post, snippet in results:
+        line = f"[{post.title}]({post.post_url})"
+        if snippet:
+            line += "\n> " + " ".join(snippet.split())
+        lines.append(line)
+    embed = discord.Embed(
+        title=f"「{label}」の告知（{len(results)} 件）",
+        description=render.split_text("\n".join(lines), 4096)[0],
+    )
+    embed.set_footer(text=f"アーカイブ {archive.count()} 件から検索")
+    await interaction.response.send_message(embed=embed)
+
+
+def _subscription_series(series: str) -> str | None:
+    if series.lower() == "all":
+        return ALL_SERIES
+    return SERIES_ALIASES.get(series.upper())
+
+
+@client.tree.command(
+    name="subscribe", description="このチャンネルで AtCoder の告知を受け取ります"
+)
+@app_commands.describe(
+    series=f"all/{_SERIES_CHOICES} のいずれか（既定: all）",
+    role="告知時にメンションするロール（任意）",
+)
+@app_commands.guild_only()
+@app_commands.default_permissions(manage_channels=True)
+async def slash_subscribe(
+    interaction: discord.Interaction, series: str = "all", role: discord.Role = None
+):
+    sp = _subscription_series(series)
+    if not sp:
+        await interaction.response.send_message(
+            f"シリーズは all/{_SERIES_CHOICES} から指定してください。", ephemeral=True
+        )
+        return
+    subscriptions.subscribe(
+        interaction.guild_id,
+        interaction.channel_id,
+        sp,
+        role.id if role else None,
+    )
+    mention = f"（{role.mention} をメンション）" if role else ""
+    await interaction.response.send_message(
+        f"このチャンネルで {series.upper()} の告知を受け取ります{mention}",
+        ephemeral=True,
+    )
+
+
+@client.tree.command(
+    name="unsubscribe", description="このチャンネルでの告知の受け取りをやめます"
+)
+@app_commands.describe(series=f"all/{_SERIES_CHOICES}（省略時はすべて解除）")
+@app_commands.guild_only()
+@app_commands.default_permissions(manage_channels=True)
+async def slash_unsubscribe(interaction: discord.Interaction, series: str = None):
+    sp = _subscription_series(series) if series else None
+    if series and not sp:
+        await interaction.response.send_message(
+            f"シリーズは all/{_SERIES_CHOICES} から指定してください。", ephemeral=True
+        )
+        return
+    removed = subscriptions.unsubscribe(interaction.channel_id, sp)
+    await interaction.response.send_message(
+        f"{removed} 件の登録を解除しました。", ephemeral=True
     )
 
 
@@ -217,510 +901,710 @@ async def send_saved_post_on_startup():
         print("SEND_LATEST_ON_STARTUP が有効ですが TARGET_CHANNEL_ID が未設定です")
         return
 
-    timeout = aiohttp.ClientTimeout(total=30)
-    headers = {"User-Agent": "AtCoderWatchBot/1.0 (+https://example.local/)"}
-    async with aiohttp.ClientSession(timeout=timeout, headers=headers) as session:
+    # ポーラーの最初の /home 解析結果を使い、同じページを二度取りにいかない
+    try:
+        await asyncio.wait_for(_panel_ready.wait(), STARTUP_PANEL_WAIT)
+        links = _panel_links
+    except asyncio.TimeoutError:
         try:
-            async with session.get(ATCODER_URL) as resp:
-                if resp.status != 200:
-                    print("起動時 /home 取得失敗 status=", resp.status)
-                    return
-                html_text = await resp.text()
+            status, html_text = await http.get_text(
+                ATCODER_URL, hedge=True, until=extract.PanelScanner
+            )
         except Exception as e:
             print("起動時 /home 取得エラー:", e)
             return
+        if status != 200:
+            print("起動時 /home 取得失敗 status=", status)
+            return
+        links = await parse_pool.run(parsing.contest_panel_links, html_text)
 
-    soup = BeautifulSoup(html_text, "html.parser")
-    panel = _find_contest_panel(soup)
-    if not panel:
+    if links is None:
         print("起動時: 直近のコンテストの告知パネルが見つかりませんでした")
         return
 
-    a = panel.find("a", href=lambda h: h and h.startswith("/posts/"))
-    if not a:
+    if not links:
         print("起動時: パネル内に投稿リンクが見つかりませんでした")
         return
 
-    href = a["href"]
-    post_url = f"https://atcoder.jp{href}"
-    latest_post_id = href.rstrip("/").split("/")[-1]
-    latest_title = a.get_text(strip=True)
+    latest_title, post_url = links[0]
 
-    is_contest_post = False
-    timeout = aiohttp.ClientTimeout(total=30)
-    headers = {"User-Agent": "AtCoderWatchBot/1.0 (+https://example.local/)"}
-    async with aiohttp.ClientSession(timeout=timeout, headers=headers) as session2:
-        try:
-            async with session2.get(post_url) as resp:
-                if resp.status == 200:
-                    post_html = await resp.text()
-                    psoup = BeautifulSoup(post_html, "html.parser")
-                    ca = psoup.find(
-                        "a",
-                        href=lambda h: h
-                        and (
-                            h.startswith("/contests/")
-                            or (h.startswith("https://atcoder.jp/contests/"))
-                        ),
-                    )
-                    if ca:
-                        is_contest_post = True
-                else:
-                    print("起動時の投稿取得失敗 status=", resp.status)
-        except Exception as e:
-            print("起動時の投稿取得エラー:", e)
+    post = None
+    try:
+        post = await _load_post(post_url, latest_title, need_text=True)
+    except Exception as e:
+        print("起動時の投稿取得エラー:", e)
 
-    if not is_contest_post:
+    if not post or not post.is_contest:
         print("起動時: この投稿はコンテスト告知ではありません（/contests/ リンクなし）")
-        try:
-            LAST_HASH_FILE.write_text(f"contest:{latest_post_id}")
-        except Exception:
-            pass
         return
-    try:
-        LAST_HASH_FILE.write_text(f"contest:{latest_post_id}")
-    except Exception:
-        pass
 
-    timeout = aiohttp.ClientTimeout(total=30)
-    headers = {"User-Agent": "AtCoderWatchBot/1.0 (+https://example.local/)"}
-    async with aiohttp.ClientSession(timeout=timeout, headers=headers) as session:
-        try:
-            async with session.get(post_url) as resp:
-                if resp.status != 200:
-                    print("起動時の投稿取得失敗 status=", resp.status)
-                    return
-                post_html = await resp.text()
-        except Exception as e:
-            print("起動時の投稿取得エラー:", e)
-            return
-
-    psoup = BeautifulSoup(post_html, "html.parser")
-    body = psoup.select_one("div.panel-body.blog-post") or psoup.select_one(
-        "div.panel-body"
-    )
-    body_html = html.unescape(str(body)) if body else ""
-    text = md(body_html, strip=["span", "time", "div"]) if body_html else ""
-    pat_img = r"!\[[^\]]*\]\([^)]*\)\s*"
-    text = re.sub(pat_img, "", text)
-    pat_user = r"\((/users/[^)]*)\)"
-    text = re.sub(pat_user, r"(https://atcoder.jp\1)", text)
-
-    channel = client.get_channel(int(TARGET_CHANNEL_ID))
-    if channel is None:
-        try:
-            channel = await client.fetch_channel(int(TARGET_CHANNEL_ID))
-        except Exception:
-            channel = None
+    text = post.text or ""
 
+    channel = await _resolve_channel(int(TARGET_CHANNEL_ID))
     if not channel:
         print("指定チャンネルが見つかりません:", TARGET_CHANNEL_ID)
         return
 
     if text:
-        desc = text if len(text) <= 1900 else text[:1900] + "…"
-        embed = discord.Embed(
-            title=f"直近のコンテスト告知: {latest_title}",
-            url=post_url,
-            description=desc,
-        )
-        await channel.send(
-            content="【テスト送信】直近のコンテスト告知を送信します", embed=embed
+        await _send_pages(
+            channel,
+            "【テスト送信】直近のコンテスト告知を送信します",
+            _post_embeds(f"直近のコンテスト告知: {latest_title}", post_url, text),
         )
     else:
-        await channel.send(
-            f"【テスト送信】直近のコンテスト告知: {post_url} (本文が取得できませんでした)"
+        await _send(
+            channel,
+            f"【テスト送信】直近のコンテスト告知: {post_url} (本文が取得できませんでした)",
         )
 
 
+async def _resume_then_poll():
+    try:
+        await _resume_pending_deliveries()
+    except Exception as e:
+        print("未送信の告知の再送エラー:", e)
+    await check_atcoder_loop()
+
+
 async def check_atcoder_loop():
-    timeout = aiohttp.ClientTimeout(total=30)
-    headers = {"User-Agent": "AtCoderWatchBot/1.0 (+https://example.local/)"}
-    async with aiohttp.ClientSession(timeout=timeout, headers=headers) as session:
-        while True:
+    loop = asyncio.get_running_loop()
+    next_calendar = 0.0
+    while True:
+        if loop.time() >= next_calendar:
+            next_calendar = loop.time() + CONTESTS_REFRESH
+            await _refresh_timetable()
+        try:
+            outcome = await _poll_once()
+        except Exception as e:
+            print("AtCoderチェックエラー:", e)
+            outcome = "error"
+        delay = _next_poll_delay(outcome)
+        expected = loop.time() + delay
+        await asyncio.sleep(delay)
+        POLL_TICK_LAG_SECONDS.observe(max(0.0, loop.time() - expected))
+
+
+def _next_poll_delay(outcome: str) -> float:
+    """ポーリング結果（new / idle / error）を学習し、次のポーリングまでの秒数を返す。"""
+    if not ADAPTIVE_POLL:
+        return POLL_INTERVAL
+    if outcome == "new":
+        poll_scheduler.record_new()
+        state_store.set("announce_hours", json.dumps(poll_scheduler.hour_weights))
+        state_store.flush()
+    elif outcome == "error":
+        poll_scheduler.record_error(http.retry_after.get(ATCODER_URL))
+    else:
+        poll_scheduler.record_idle()
+    return poll_scheduler.next_delay()
+
+
+async def _refresh_timetable():
+    """
+    /contests/ を条件付き GET し、変わっていれば時刻表を差分更新して
+    スケジューラの注目時間帯も作り直す。
+    """
+    try:
+        status, html_text, validators = await http.get_conditional(
+            CONTESTS_URL,
+            _timetable_validators.get("etag"),
+            _timetable_validators.get("last_modified"),
+            until=extract.ContestTableScanner,
+        )
+        if status == 304:
+            return
+        if status != 200:
+            print("コンテスト予定表の取得失敗 status=", status)
+            return
+        contests = await parse_pool.run(parsing.contest_timetable, html_text)
+    except Exception as e:
+        print("コンテスト予定表の取得エラー:", e)
+        return
+    if timetable.update(contests):
+        poll_scheduler.set_contests(timetable.contests())
+        state_store.set("timetable", json.dumps(timetable.snapshot()))
+        state_store.flush()
+        _schedule_reminders()
+    _timetable_validators.update(validators)
+
+
+async def _fetch_archived_post(post_id: int) -> Post | None:
+    """埋め戻し用に投稿ページを取得して解析する。存在しない投稿は None、取得の失敗は例外。"""
+    post_url = parsing.abs_url(f"/posts/{post_id}")
+    # ポーリングとはブレーカ・再送の予算を分け、埋め戻しの失敗でポーリングを止めない
+    status, post_html = await http.get_text(
+        post_url, until=extract.BodyScanner, group="posts-backfill"
+    )
+    if status == 404:
+        return None
+    if status != 200:
+        raise ConnectionError(
+            f"/posts/{post_id} の取得に失敗しました (status={status})"
+        )
+    return await parse_pool.run(parsing.parse_archived_post, post_url, post_html)
+
+
+backfill = Backfill(
+    archive,
+    state_store,
+    _fetch_archived_post,
+    concurrency=int(os.getenv("ARCHIVE_CONCURRENCY", "2")),
+    rate=float(os.getenv("ARCHIVE_RATE", "0.5")),
+    floor=int(os.getenv("ARCHIVE_FLOOR", "1")),
+)
+
+
+async def _run_backfill():
+    """パネルの最新の投稿 ID から告知アーカイブを埋め戻す。失敗したら ARCHIVE_RETRY 秒後に続きから。"""
+    await _panel_ready.wait()
+    while True:
+        ids = [
+            int(parsing.post_id(url))
+            for _, url in _panel_links or []
+            if parsing.post_id(url).isdigit()
+        ]
+        if ids:
             try:
-                async with session.get(ATCODER_URL) as resp:
-                    if resp.status != 200:
-                        print("AtCoder取得失敗 status=", resp.status)
-                        await asyncio.sleep(POLL_INTERVAL)
-                        continue
-                    text = await resp.text()
-
-                soup = BeautifulSoup(text, "html.parser")
-                panel = _find_contest_panel(soup)
-                latest_id = None
-                latest_title = None
-                latest_url = None
-                if panel:
-                    a = panel.find("a", href=lambda h: h and h.startswith("/posts/"))
-                    if a:
-                        href = a["href"]
-                        latest_id = href.rstrip("/").split("/")[-1]
-                        latest_title = a.get_text(strip=True)
-                        latest_url = f"https://atcoder.jp{href}"
-                last_raw = ""
-                if LAST_HASH_FILE.exists():
-                    last_raw = LAST_HASH_FILE.read_text().strip()
-
-                if latest_id:
-                    last_contest = (
-                        last_raw[8:] if last_raw.startswith("contest:") else ""
-                    )
-
-                    if last_contest and latest_id != last_contest:
-                        if TARGET_CHANNEL_ID:
-                            channel = client.get_channel(int(TARGET_CHANNEL_ID))
-                            if channel is None:
-                                try:
-                                    channel = await client.fetch_channel(
-                                        int(TARGET_CHANNEL_ID)
-                                    )
-                                except Exception:
-                                    channel = None
-                            if channel:
-                                post_text = ""
-                                is_contest_post = False
-                                try:
-                                    async with session.get(latest_url) as post_resp:
-                                        if post_resp.status == 200:
-                                            post_html = await post_resp.text()
-                                            psoup = BeautifulSoup(
-                                                post_html, "html.parser"
-                                            )
-                                            body = psoup.select_one(
-                                                "div.panel-body.blog-post"
-                                            ) or psoup.select_one("div.panel-body")
-                                            if body:
-                                                body_html = (
-                                                    html.unescape(str(body))
-                                                    if body
-                                                    else ""
-                                                )
-                                                text = (
-                                                    md(
-                                                        body_html,
-                                                        strip=["span", "time", "div"],
-                                                    )
-                                                    if body_html
-                                                    else ""
-                                                )
-                                                pat_img = r"!\[[^\]]*\]\([^)]*\)\s*"
-                                                text = re.sub(pat_img, "", text)
-                                                pat_user = r"\((/users/[^)]*)\)"
-                                                post_text = re.sub(
-                                                    pat_user,
-                                                    r"(https://atcoder.jp\1)",
-                                                    text,
-                                                )
-                                            # 本文から /contests/{slug} のURLを抽出（ルート /contests/ は除外）
-                                            contest_url = _find_contest_url(
-                                                body or psoup
-                                            )
-                                            is_contest_post = contest_url is not None
-                                        else:
-                                            print(
-                                                "投稿ページ取得失敗 status=",
-                                                post_resp.status,
-                                            )
-                                except Exception as e:
-                                    print("投稿取得エラー:", e)
-
-                                if not is_contest_post:
-                                    print(
-                                        "検出された投稿はコンテスト告知ではありません（/contests/ リンクなし）: ",
-                                        latest_url,
-                                    )
-                                else:
-                                    if post_text:
-
-                                        desc = post_text
-                                        if len(desc) > 1900:
-                                            desc = desc[:1900] + "…"
-                                        embed = discord.Embed(
-                                            title=latest_title,
-                                            url=latest_url,
-                                            description=desc,
-                                        )
-                                        # 抽出した contest_url でシリーズ判定してロールメンション
-                                        role_prefix = _role_mention_for_contest(
-                                            contest_url or ""
-                                        )
-                                        await channel.send(
-                                            content=f"{role_prefix}【AtCoder 告知】",
-                                            embed=embed,
-                                            allowed_mentions=discord.AllowedMentions(
-                                                roles=True
-                                            ),
-                                        )
-                                    else:
-                                        role_prefix = _role_mention_for_contest(
-                                            contest_url or ""
-                                        )
-                                        await channel.send(
-                                            content=f"{role_prefix}【AtCoder 告知】{latest_title}\n{latest_url}",
-                                            allowed_mentions=discord.AllowedMentions(
-                                                roles=True
-                                            ),
-                                        )
-                            else:
-                                print("チャネルが見つかりません:", TARGET_CHANNEL_ID)
-                        else:
-                            print(
-                                "TARGET_CHANNEL_ID が設定されていません。更新を検知:",
-                                latest_url,
-                            )
-
-                    LAST_HASH_FILE.write_text(f"contest:{latest_id}")
-                else:
-                    h = hashlib.sha256(text.encode("utf-8")).hexdigest()
-                    last_hash = last_raw[5:] if last_raw.startswith("hash:") else ""
-
-                    if last_hash and h != last_hash:
-                        if TARGET_CHANNEL_ID:
-                            channel = client.get_channel(int(TARGET_CHANNEL_ID))
-                            if channel is None:
-                                try:
-                                    channel = await client.fetch_channel(
-                                        int(TARGET_CHANNEL_ID)
-                                    )
-                                except Exception:
-                                    channel = None
-                            if channel:
-                                await channel.send(
-                                    f"AtCoderのページが更新されました: {ATCODER_URL}"
-                                )
-                            else:
-                                print("チャネルが見つかりません:", TARGET_CHANNEL_ID)
-                        else:
-                            print(
-                                "TARGET_CHANNEL_ID が設定されていません。更新を検知しました:",
-                                ATCODER_URL,
-                            )
-
-                    LAST_HASH_FILE.write_text(f"hash:{h}")
+                await backfill.run(max(ids))
+                return
+            except Exception as e:
+                print("告知アーカイブの埋め戻しエラー:", e)
+        await asyncio.sleep(ARCHIVE_RETRY)
+
+
+async def _poll_once() -> str:
+    """
+    /home を 1 回取得し、新しい告知があれば送信して状態を更新する。
+    戻り値は "new"（新しい投稿を検知）/ "idle"（変化なし）/ "error"。
+    """
+    try:
+        return await _poll_home()
+    finally:
+        # 変更があった状態だけを 1 トランザクションで書く
+        _flush_state()
+
+
+def _seed_panel(
+    panel_links: list[tuple[str, str]], last_raw: str
+) -> list[tuple[str, str]]:
+    """
+    既読集合を初めて作る。前回の状態（contest:ID。旧形式の状態ファイルから移行したものを含む）が
+    あればその ID までを既読にし、停止中に出た新しい投稿は告知するため古い順に返す。
+    前回の状態が無ければ（新規の導入）パネルの投稿をすべて既読にするだけで告知しない。
+    """
+    last_id = last_raw[len("contest:") :] if last_raw.startswith("contest:") else ""
+    new_links = []
+    for title, post_url in reversed(panel_links):
+        post_id = parsing.post_id(post_url)
+        if last_id.isdigit() and post_id.isdigit() and int(post_id) > int(last_id):
+            new_links.append((title, post_url))
+        else:
+            state_store.mark_seen(post_id)
+    return new_links
+
+
+async def _poll_home() -> str:
+    global _panel_links
+    last = _read_last_state()
+    if CONDITIONAL_POLL:
+        # 索引が未構築の間は 304 でパースを飛ばされないよう validators を送らない
+        use_validators = bool(last["state"]) and series_index.ready
+        status, text, validators = await http.get_conditional(
+            ATCODER_URL,
+            last["etag"] if use_validators else None,
+            last["last_modified"] if use_validators else None,
+            hedge=True,
+            until=extract.PanelScanner,
+        )
+    else:
+        status, text = await http.get_text(
+            ATCODER_URL, hedge=True, until=extract.PanelScanner
+        )
+        validators = {"etag": None, "last_modified": None}
+    POLL_STATS["requests"] += 1
+    if status == 304:
+        # 変更なし: パース・ハッシュ計算をすべて省略する
+        POLL_STATS["not_modified"] += 1
+        POLL_STATS["skipped_parses"] += 1
+        POLL_STATS["bytes_saved"] += last["length"]
+        _log_poll_stats()
+        return "idle"
+    if status != 200:
+        print("AtCoder取得失敗 status=", status)
+        return "error"
+    _log_poll_stats()
+    body_length = len(text.encode("utf-8"))
+
+    panel_links = await parse_pool.run(parsing.contest_panel_links, text)
+    _panel_links = panel_links
+    _panel_ready.set()
+    try:
+        await _refresh_series_index(
+            panel_links or await parse_pool.run(parsing.page_post_links, text)
+        )
+    except Exception as e:
+        print("シリーズ索引の更新エラー:", e)
+    latest_id = None
+    latest_title = None
+    latest_url = None
+    if panel_links:
+        latest_title, latest_url = panel_links[0]
+        latest_id = parsing.post_id(latest_url)
+    last_raw = last["state"]
+    outcome = "idle"
+
+    if latest_id:
+        if not state_store.get("panel_seeded"):
+            new_links = _seed_panel(panel_links, last_raw)
+            state_store.set("panel_seeded", 1)
+        else:
+            # パネル全体を既読集合と突き合わせ、未処理の投稿を古い順に処理する
+            new_links = [
+                (title, post_url)
+                for title, post_url in reversed(panel_links)
+                if not state_store.is_seen(parsing.post_id(post_url))
+            ]
+        # 取得できずに未処理のまま残った投稿だけなら new にしない（間隔を詰め続けないように）
+        if new_links and await _announce_posts(new_links):
+            outcome = "new"
+
+        _write_last_state(f"contest:{latest_id}", validators, body_length)
+    else:
+        h = await parse_pool.run(_sha256_hex, text)
+        last_hash = last_raw[5:] if last_raw.startswith("hash:") else ""
+
+        if last_hash and h != last_hash:
+            messages = {
+                channel_id: {
+                    "content": f"AtCoderのページが更新されました: {ATCODER_URL}"
+                }
+                for channel_id in subscriptions.targets()
+            }
+            if messages:
+                await deliverer.deliver(messages)
+            else:
+                print("配信先が登録されていません。更新を検知しました:", ATCODER_URL)
+
+        _write_last_state(f"hash:{h}", validators, body_length)
+    return outcome
+
+
+async def _announce_posts(links: list[tuple[str, str]]) -> int:
+    """
+    新しい投稿（古い順の (title, post_url)）をまとめて並列に取得し、古い順に告知する。
+    取得に失敗した投稿は既読にせず、次のポーリングで再試行する。
+    戻り値は取得して判定できた（既読にした）投稿の数。
+    """
+    sem = asyncio.Semaphore(max(1, SERIES_SCAN_CONCURRENCY))
 
+    async def load(title: str, post_url: str) -> Post | None:
+        async with sem:
+            try:
+                return await _load_post(post_url, title, need_text=True)
             except Exception as e:
-                print("AtCoderチェックエラー:", e)
-            await asyncio.sleep(POLL_INTERVAL)
+                print("投稿取得エラー:", e)
+                return None
+
+    posts = await asyncio.gather(*(load(title, url) for title, url in links))
+    deliveries = []
+    classified = 0
+    for (title, post_url), post in zip(links, posts):
+        if post is None:
+            continue
+        # 判定できた投稿は、配信先が無くても（全チャンネル送信済みでも）既読にする
+        state_store.mark_seen(post.post_id)
+        classified += 1
+        if not post.is_contest:
+            print(
+                "検出された投稿はコンテスト告知ではありません（/contests/ リンクなし）: ",
+                post_url,
+            )
+            continue
+        if not len(subscriptions):
+            print("配信先が登録されていません。更新を検知:", post_url)
+            continue
+        # 送信済み・送信中のチャンネルには送らない
+        targets = {
+            channel_id: roles
+            for channel_id, roles in subscriptions.targets(post.series).items()
+            if state_store.delivery_status(post.post_id, channel_id) is None
+        }
+        deliveries.append(_deliver_post(post, title, targets))
+    # 古い順に受け付けさせ、同じチャンネル宛てのものは 1 通にまとめて送る
+    await asyncio.gather(*deliveries)
+    return classified
+
+
+def _delivery_nonce(post_id: str, channel_id: int) -> int:
+    # 同じ (投稿, チャンネル) には常に同じ nonce を使い、再送を Discord 側で重複排除させる
+    digest = hashlib.sha256(f"{post_id}:{channel_id}".encode()).hexdigest()
+    return int(digest[:15], 16)
+
+
+def _role_mention(roles: list[int]) -> str:
+    return "".join(f"<@&{role_id}> " for role_id in roles)
+
+
+async def _deliver_tracked(delivery_id: str, messages: dict[int, dict]) -> dict:
+    """
+    messages（{channel_id: send の kwargs}）を並列に送り、(delivery_id, チャンネル) 毎に配信記録を残す。
+    送信前に pending を書いてから送るので、途中で落ちても再起動後に同じ nonce で送り直せる。
+    まとめ送信でも (delivery_id, チャンネル) ごとに、それを含むメッセージを送った時点で記録する。
+    前回から pending のままの配信は、他の配信とまとめずに単独で送り直す。
+    """
+    resumed = set()
+    for channel_id, kwargs in messages.items():
+        if state_store.delivery_status(delivery_id, channel_id) == PENDING:
+            resumed.add(channel_id)
+        state_store.set_delivery(delivery_id, channel_id, PENDING)
+        kwargs["nonce"] = _delivery_nonce(delivery_id, channel_id)
+    state_store.flush()
+
+    async def send(channel_id: int, kwargs: dict) -> bool:
+        ok = await digest_queue.submit(
+            channel_id, delivery_id, kwargs, alone=channel_id in resumed
+        )
+        state_store.set_delivery(delivery_id, channel_id, SENT if ok else FAILED)
+        state_store.flush()
+        return ok
+
+    sent = await asyncio.gather(
+        *(send(channel_id, kwargs) for channel_id, kwargs in messages.items())
+    )
+    return dict(zip(messages, sent))
+
+
+async def _deliver_post(post: Post, title: str, targets: dict[int, list[int]]):
+    """告知を targets（{channel_id: [ロール ID]}）へ送る。"""
+    post_id, post_url = post.post_id, post.post_url
+    state_store.mark_seen(post_id)
+    if not targets:
+        return
+
+    embeds = _post_embeds(title, post_url, post.text)
+    messages = {}
+    for channel_id, roles in targets.items():
+        # 購読しているシリーズのロールをメンションする
+        messages[channel_id] = {
+            "content": f"{_role_mention(roles)}【AtCoder 告知】",
+            "embeds": embeds,
+            "allowed_mentions": discord.AllowedMentions(roles=True),
+        }
+    results = await _deliver_tracked(post_id, messages)
+    print(f"告知を配信しました: {sum(results.values())}/{len(results)} チャンネル")
+
+
+async def _resume_pending_deliveries():
+    """前回の終了時に送信途中だった配信を送り直す。"""
+    for post_id, channel_ids in state_store.pending_deliveries().items():
+        if post_id.startswith(REMINDER_PREFIX):
+            continue  # リマインダは _schedule_reminders() が組み直す
+        post = post_cache.get(post_id)
+        if post is None or post.text is None:
+            title = post.title if post else f"/posts/{post_id}"
+            try:
+                post = await _load_post(
+                    parsing.abs_url(f"/posts/{post_id}"), title, need_text=True
+                )
+            except Exception as e:
+                print("未送信の告知の取得エラー:", e)
+                post = None
+        if post is None:
+            for channel_id in channel_ids:
+                state_store.set_delivery(post_id, channel_id, FAILED)
+            state_store.flush()
+            continue
+        targets = subscriptions.targets(post.series)
+        await _deliver_post(
+            post,
+            post.title,
+            {channel_id: targets.get(channel_id, []) for channel_id in channel_ids},
+        )
+
+
+REMINDER_PREFIX = "remind:"
+
+
+def _format_offset(seconds: int) -> str:
+    for unit, label in ((86400, "日"), (3600, "時間"), (60, "分")):
+        if seconds % unit == 0:
+            return f"{seconds // unit}{label}"
+    return f"{seconds}秒"
+
+
+def _schedule_reminders():
+    """時刻表からリマインダを組み直す。時刻表から消えたコンテストの分は取り消す。"""
+    now = time.time()
+    wanted = set()
+    for contest in timetable.contests():
+        for offset in REMINDER_OFFSETS:
+            fire_at = contest.start - offset
+            if fire_at < now - REMINDER_GRACE:
+                continue
+            key = f"{REMINDER_PREFIX}{contest.slug}:{offset}"
+            wanted.add(key)
+            reminder_scheduler.schedule(key, fire_at, (contest.slug, offset))
+    for key in reminder_scheduler.keys() - wanted:
+        reminder_scheduler.cancel(key)
+
+
+async def _send_reminder(key: str, payload: tuple[str, int]):
+    """コンテストのシリーズを購読しているチャンネルへリマインダを送る（送信済みのチャンネルは除く）。"""
+    slug, offset = payload
+    contest = timetable.get(slug)
+    if contest is None:
+        return
+    series = [contest.series] if contest.series else []
+    messages = {}
+    for channel_id, roles in subscriptions.targets(series).items():
+        if state_store.delivery_status(key, channel_id) not in (None, PENDING):
+            continue
+        messages[channel_id] = {
+            "content": (
+                f"{_role_mention(roles)}⏰ {contest.title} の開始まで{_format_offset(offset)}です"
+                f"（<t:{int(contest.start)}:f>）\nhttps://atcoder.jp/contests/{slug}"
+            ),
+            "allowed_mentions": discord.AllowedMentions(roles=True),
+        }
+    if not messages:
+        return
+    results = await _deliver_tracked(key, messages)
+    print(
+        f"リマインダを送信しました {slug}: {sum(results.values())}/{len(results)} チャンネル"
+    )
+
+
+reminder_scheduler = ReminderScheduler(_send_reminder)
 
 
 async def send_latest_announcements(channel):
     """/home から『直近のコンテストの告知』パネルの最新投稿を取得し、本文HTMLをMarkdownに変換して指定チャンネルへ送信する。"""
 
-    timeout = aiohttp.ClientTimeout(total=30)
-    headers = {"User-Agent": "AtCoderWatchBot/1.0 (+https://example.local/)"}
-    async with aiohttp.ClientSession(timeout=timeout, headers=headers) as session:
-        try:
-            async with session.get(ATCODER_URL) as resp:
-                if resp.status != 200:
-                    await channel.send(
-                        f"/home の取得に失敗しました (status={resp.status})"
-                    )
-                    return
-                html_text = await resp.text()
-        except Exception as e:
-            await channel.send(f"/home 取得エラー: {e}")
-            return
+    try:
+        status, html_text = await http.get_text(
+            ATCODER_URL, hedge=True, until=extract.PanelScanner
+        )
+    except Exception as e:
+        await _send(channel, f"/home 取得エラー: {e}")
+        return
+    if status != 200:
+        await _send(channel, f"/home の取得に失敗しました (status={status})")
+        return
 
-    soup = BeautifulSoup(html_text, "html.parser")
-    panel = _find_contest_panel(soup)
-    if not panel:
-        await channel.send("『直近のコンテストの告知』パネルが見つかりませんでした。")
+    links = await parse_pool.run(parsing.contest_panel_links, html_text)
+    if links is None:
+        await _send(channel, "『直近のコンテストの告知』パネルが見つかりませんでした。")
         return
 
-    a = panel.find("a", href=lambda h: h and h.startswith("/posts/"))
-    if not a:
-        await channel.send("パネル内に投稿リンクが見つかりませんでした。")
+    if not links:
+        await _send(channel, "パネル内に投稿リンクが見つかりませんでした。")
         return
 
-    href = a["href"]
-    post_url = f"https://atcoder.jp{href}"
-    latest_post_id = href.rstrip("/").split("/")[-1]
-    latest_title = a.get_text(strip=True)
+    latest_title, post_url = links[0]
+    latest_post_id = parsing.post_id(post_url)
 
-    is_contest_post = False
-    timeout = aiohttp.ClientTimeout(total=30)
-    headers = {"User-Agent": "AtCoderWatchBot/1.0 (+https://example.local/)"}
-    async with aiohttp.ClientSession(timeout=timeout, headers=headers) as session2:
-        try:
-            async with session2.get(post_url) as resp:
-                if resp.status == 200:
-                    post_html = await resp.text()
-                    psoup = BeautifulSoup(post_html, "html.parser")
-                    ca = psoup.find(
-                        "a",
-                        href=lambda h: h
-                        and (
-                            h.startswith("/contests/")
-                            or (h.startswith("https://atcoder.jp/contests/"))
-                        ),
-                    )
-                    if ca:
-                        is_contest_post = True
-                else:
-                    await channel.send(
-                        f"投稿ページの取得に失敗しました (status={resp.status})"
-                    )
-        except Exception as e:
-            await channel.send(f"投稿取得エラー: {e}")
+    try:
+        post = await _load_post(post_url, latest_title, need_text=True)
+    except Exception as e:
+        await _send(channel, f"投稿取得エラー: {e}")
+        return
+    if post is None:
+        await _send(channel, "投稿ページの取得に失敗しました")
+        return
 
-    if not is_contest_post:
-        await channel.send(
-            "この投稿はコンテスト告知ではありません（/contests/ リンクなし）"
+    if not post.is_contest:
+        await _send(
+            channel, "この投稿はコンテスト告知ではありません（/contests/ リンクなし）"
         )
 
         try:
-            LAST_HASH_FILE.write_text(f"contest:{latest_post_id}")
+            _write_last_state(f"contest:{latest_post_id}")
+            _flush_state()
         except Exception:
             pass
         return
 
-    timeout = aiohttp.ClientTimeout(total=30)
-    headers = {"User-Agent": "AtCoderWatchBot/1.0 (+https://example.local/)"}
-    async with aiohttp.ClientSession(timeout=timeout, headers=headers) as session:
-        try:
-            async with session.get(post_url) as resp:
-                if resp.status != 200:
-                    await channel.send(
-                        f"投稿ページの取得に失敗しました (status={resp.status})"
-                    )
-                    return
-                post_html = await resp.text()
-        except Exception as e:
-            await channel.send(f"投稿取得エラー: {e}")
-            return
-
-    psoup = BeautifulSoup(post_html, "html.parser")
-
-    body = psoup.select_one("div.panel-body.blog-post") or psoup.select_one(
-        "div.panel-body"
-    )
-    body_html = html.unescape(str(body)) if body else ""
-    text = md(body_html, strip=["span", "time", "div"]) if body_html else ""
-    pat_img = r"!\[[^\]]*\]\([^)]*\)\s*"
-    text = re.sub(pat_img, "", text)
-    pat_user = r"\((/users/[^)]*)\)"
-    text = re.sub(pat_user, r"(https://atcoder.jp\1)", text)
+    text = post.text or ""
 
     if text:
-        desc = text if len(text) <= 1900 else text[:1900] + "…"
-        embed = discord.Embed(
-            title=f"直近のコンテスト告知: {latest_title}",
-            url=post_url,
-            description=desc,
-        )
-        await channel.send(
-            content="【AtCoder 告知】直近のコンテスト告知を送信します", embed=embed
+        await _send_pages(
+            channel,
+            "【AtCoder 告知】直近のコンテスト告知を送信します",
+            _post_embeds(f"直近のコンテスト告知: {latest_title}", post_url, text),
         )
     else:
-        await channel.send(
-            f"直近のコンテスト告知: {post_url} (本文が取得できませんでした)"
+        await _send(
+            channel, f"直近のコンテスト告知: {post_url} (本文が取得できませんでした)"
         )
 
 
-async def _fetch_latest_series_announcement(
-    session: aiohttp.ClientSession, series_prefix: str
-):
+async def _refresh_series_index(post_hrefs: list[tuple[str, str]]):
     """
-    /home の『直近のコンテストの告知』パネル内の投稿を新しい順に辿り、
-    各 /posts/ ページを開いて /contests/{series_prefix} へのリンクを含むものを探し、
-    本文HTMLをmd変換して返す。
-    戻り値: dict(title, post_url, text) または None
+    パネルの投稿のうち未処理の ID だけを読み込み、シリーズ索引を差分更新する。
+    投稿はキャッシュ経由なので、一度見た投稿では通信もパースも発生しない。
+    未処理の投稿は SERIES_SCAN_CONCURRENCY 件ずつ並列に取得する（続く告知の処理はキャッシュから読む）。
     """
+    sem = asyncio.Semaphore(max(1, SERIES_SCAN_CONCURRENCY))
 
-    async with session.get(ATCODER_URL) as resp:
-        if resp.status != 200:
-            return None
-        html_text = await resp.text()
+    def wanted(entry: Post) -> bool:
+        # 索引を更新する投稿と、このあと告知する（未処理の）投稿だけ本文まで変換する
+        return not state_store.is_seen(entry.post_id) or any(
+            series_index.wants(sp, entry.post_id) for sp in entry.series
+        )
 
-    soup = BeautifulSoup(html_text, "html.parser")
-    panel = _find_contest_panel(soup)
+    async def load(title: str, post_url: str) -> Post | None:
+        async with sem:
+            try:
+                return await _load_post(post_url, title, render_if=wanted)
+            except Exception as e:
+                print("シリーズ索引の投稿取得エラー:", e)
+                return None
+
+    unseen = [
+        (title, post_url)
+        for title, post_url in post_hrefs[:SERIES_SCAN_LIMIT]
+        if not series_index.is_seen(parsing.post_id(post_url))
+    ]
+    entries = await asyncio.gather(*(load(title, url) for title, url in unseen))
+    changed = False
+    for (_, post_url), entry in zip(unseen, entries):
+        if entry is None:
+            continue
+        for sp in entry.series:
+            changed |= series_index.update(sp, entry)
+        series_index.mark_seen(parsing.post_id(post_url))
+    series_index.ready = True
+    if changed:
+        state_store.set("series_index", json.dumps(series_index.snapshot()))
 
-    links = []
-    if panel:
-        links = panel.find_all("a", href=lambda h: h and h.startswith("/posts/"))
 
-    if not links:
-        links = soup.find_all("a", href=lambda h: h and h.startswith("/posts/"))
+async def _fetch_latest_series_announcement(series_prefix: str):
+    """
+    /home の『直近のコンテストの告知』パネル内の投稿を新しい順に辿り、
+    各 /posts/ ページを開いて /contests/{series_prefix} へのリンクを含むものを探し、
+    本文HTMLをmd変換して返す。
+    戻り値: 本文まで変換した Post または None。/home が取れなければ ConnectionError。
+    """
 
-    seen = set()
-    post_hrefs = []
-    for a in links:
-        href = a.get("href")
-        if href and href not in seen:
-            seen.add(href)
-            title = a.get_text(strip=True) or "Announcement"
-            post_hrefs.append((title, f"https://atcoder.jp{href}"))
+    status, html_text = await http.get_text(
+        ATCODER_URL, hedge=True, until=extract.PanelScanner
+    )
+    if status != 200:
+        raise ConnectionError(f"/home の取得に失敗しました (status={status})")
 
+    post_hrefs = await parse_pool.run(parsing.panel_post_links, html_text)
     if not post_hrefs:
         return None
 
-    for title, post_url in post_hrefs[:40]:
-        try:
-            async with session.get(post_url) as pr:
-                if pr.status != 200:
-                    continue
-                post_html = await pr.text()
-        except Exception:
-            continue
+    candidates = post_hrefs[:SERIES_SCAN_LIMIT]
+    sem = asyncio.Semaphore(max(1, SERIES_SCAN_CONCURRENCY))
 
-        psoup = BeautifulSoup(post_html, "html.parser")
-        anchor_ok = (
-            psoup.find(
-                "a",
-                href=lambda h: h
-                and (
-                    h.startswith(f"/contests/{series_prefix}")
-                    or h.startswith(f"https://atcoder.jp/contests/{series_prefix}")
-                ),
-            )
-            is not None
-        )
-        text_all = psoup.get_text(" ", strip=True)
-        plain_ok = (
-            re.search(
-                rf"https?://atcoder\.jp/contests/{series_prefix}[a-z0-9\-_/]*",
-                text_all,
-                flags=re.IGNORECASE,
-            )
-            is not None
-        )
-        if not (anchor_ok or plain_ok):
-            continue
-        body = psoup.select_one("div.panel-body.blog-post") or psoup.select_one(
-            "div.panel-body"
-        )
-        body_html = html.unescape(str(body)) if body else ""
-        text = md(body_html, strip=["span", "time", "div"]) if body_html else ""
-        text = re.sub(r"!\[[^\]]*\]\([^)]*\)\s*", "", text)
-        text = re.sub(r"\((/users/[^)]*)\)", r"(https://atcoder.jp\1)", text)
+    def matches(entry: Post | None) -> bool:
+        return entry is not None and series_prefix in entry.series
 
-        return {"title": title, "post_url": post_url, "text": text}
+    async def probe(title: str, post_url: str) -> Post | None:
+        # キャッシュにあれば通信もパースもしない。Markdown 変換は一致した投稿だけ行う
+        async with sem:
+            try:
+                return await _load_post(post_url, title, render_if=matches)
+            except Exception:
+                return None
+
+    # 新しい順にタスクを作る（Semaphore は FIFO なので取得も新しい順に始まる）
+    tasks = [
+        asyncio.create_task(probe(title, post_url)) for title, post_url in candidates
+    ]
+    try:
+        # 新しい順に結果を確定させ、最初に一致したものを採用する
+        for (title, post_url), task in zip(candidates, tasks):
+            entry = await task
+            if not matches(entry):
+                continue
+            if entry.text is None:
+                try:
+                    entry = await _load_post(post_url, title, need_text=True)
+                except Exception:
+                    continue
+                if entry is None:
+                    continue
+            return entry
+    finally:
+        # 一致が確定したら残りの取得は打ち切る
+        for task in tasks:
+            task.cancel()
 
     return None
 
 
-async def send_series_announcement(series_prefix: str, channel):
-    """直近の {series_prefix} の告知投稿本文を md 変換して送信する。"""
-    timeout = aiohttp.ClientTimeout(total=30)
-    headers = {"User-Agent": "AtCoderWatchBot/1.0 (+https://example.local/)"}
-    async with aiohttp.ClientSession(timeout=timeout, headers=headers) as session:
-        data = await _fetch_latest_series_announcement(session, series_prefix)
+# 同じシリーズの同時の /contest-info は 1 回の巡回を分け合い、結果を少しのあいだ使い回す
+_series_crawls = SingleFlight(
+    "series_crawl", ttl=float(os.getenv("SERIES_CRAWL_TTL", "30"))
+)
+
+
+_revalidations: set[asyncio.Task] = set()
+
+
+def _revalidate_series(series_prefix: str):
+    """索引が未構築の間に古い答えを返したシリーズを、裏で辿り直して索引に反映する。"""
+
+    async def run():
+        try:
+            data = await _series_crawls.do(
+                series_prefix, _fetch_latest_series_announcement, series_prefix
+            )
+        except Exception as e:
+            print("シリーズ告知の再取得エラー:", e)
+            return
+        if data:
+            series_index.update(series_prefix, data)
+
+    task = asyncio.create_task(run())
+    _revalidations.add(task)
+    task.add_done_callback(_revalidations.discard)
+
+
+async def send_series_announcement(series_prefix: str, channel, span=None):
+    """直近の {series_prefix} の告知投稿本文を md 変換して送信する。span があれば段階を記録する。"""
+    data = series_index.get(series_prefix)
+    if data is not None and not series_index.ready:
+        # 前回の索引（少し古いかもしれない）で即答し、裏で取り直す
+        SERIES_LOOKUPS.inc(result="stale")
+        _revalidate_series(series_prefix)
+    elif data is None and not series_index.ready:
+        # 起動直後で索引が未構築のときだけライブで辿る
+        SERIES_LOOKUPS.inc(result="crawl")
+        try:
+            data = await _series_crawls.do(
+                series_prefix, _fetch_latest_series_announcement, series_prefix
+            )
+        except Exception as e:
+            print("シリーズ告知の取得エラー:", e)
+            await _send(
+                channel,
+                "AtCoder から告知を取得できませんでした。しばらくしてから再度お試しください。",
+            )
+            return
+    else:
+        SERIES_LOOKUPS.inc(result="hit" if data else "miss")
+    if span is not None:
+        span.mark("lookup")
 
     if not data:
-        await channel.send(
-            f"直近の {series_prefix.upper()} の告知投稿は見つかりませんでした。"
+        await _send(
+            channel,
+            f"直近の {series_prefix.upper()} の告知投稿は見つかりませんでした。",
         )
         return
 
-    title, post_url, text = data["title"], data["post_url"], data["text"]
-    desc = text if len(text) <= 1900 else text[:1900] + "…"
-    embed = discord.Embed(
-        title=f"直近の {series_prefix.upper()} 告知: {title}",
-        url=post_url,
-        description=desc,
+    title, post_url, text = data.title, data.post_url, data.text
+    await _send_pages(
+        channel,
+        "【AtCoder 告知】",
+        _post_embeds(f"直近の {series_prefix.upper()} 告知: {title}", post_url, text),
     )
-    await channel.send(content="【AtCoder 告知】", embed=embed)
+    if span is not None:
+        span.mark("send")
 
 
 @client.event
@@ -732,5 +1616,6 @@ async def on_message(message):
 # プレフィックスコマンドは廃止（スラッシュコマンドのみ）
 
 
-TOKEN = os.getenv("TOKEN")
-client.run(TOKEN)
+if __name__ == "__main__":
+    TOKEN = os.getenv("TOKEN")
+    client.run(TOKEN)
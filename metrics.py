@@ -0,0 +1,250 @@
+"""
+カウンタ・ヒストグラム・ゲージと、/contest-info 用の簡易スパン。
+Prometheus 形式の HTTP エンドポイント（METRICS_PORT）か、定期的な JSON ダンプで公開する。
+"""
+
+import asyncio
+import bisect
+import collections
+import contextlib
+import json
+import pathlib
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(key: tuple, extra: tuple = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"'))
+        for k, v in pairs
+    )
+    return "{" + body + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: dict[tuple, float] = collections.defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        with self._lock:
+            self._values[_key(labels)] += amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+    def snapshot(self):
+        with self._lock:
+            return {_fmt_labels(k) or "total": v for k, v in self._values.items()}
+
+
+class Gauge:
+    """値を set するか、読み出し時に呼ぶ関数 fn を渡す。"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn=None):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self._values: dict[tuple, float] = {}
+
+    def set(self, value: float, **labels):
+        self._values[_key(labels)] = value
+
+    def samples(self):
+        if self.fn is not None:
+            return [(self.name, (), float(self.fn()))]
+        return [(self.name, key, value) for key, value in list(self._values.items())]
+
+    def snapshot(self):
+        return {_fmt_labels(key) or "value": v for _, key, v in self.samples()}
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._series: dict[tuple, list] = {}  # key -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            idx = bisect.bisect_left(self.buckets, value)
+            if idx < len(self.buckets):
+                series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for key, (counts, total, count) in self._series.items():
+                cumulative = 0
+                for bound, c in zip(self.buckets, counts):
+                    cumulative += c
+                    out.append(
+                        (self.name + "_bucket", key + (("le", str(bound)),), cumulative)
+                    )
+                out.append((self.name + "_bucket", key + (("le", "+Inf"),), count))
+                out.append((self.name + "_sum", key, total))
+                out.append((self.name + "_count", key, count))
+        return out
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                _fmt_labels(key)
+                or "all": {
+                    "count": count,
+                    "sum": total,
+                    "mean": total / count if count else 0.0,
+                }
+                for key, (_, total, count) in self._series.items()
+            }
+
+
+class Span:
+    """1 回の処理の段階ごとの所要時間。mark(stage) で直前の mark からの経過時間を記録する。"""
+
+    def __init__(self, name: str, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.started = time.time()
+        self._t0 = self._last = time.perf_counter()
+        self.stages: list[tuple[str, float]] = []
+        self.duration = 0.0
+
+    def mark(self, stage: str):
+        now = time.perf_counter()
+        self.stages.append((stage, now - self._last))
+        self._last = now
+
+    def as_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "attrs": self.attrs,
+            "started": self.started,
+            "duration_ms": self.duration * 1000,
+            "stages_ms": {stage: d * 1000 for stage, d in self.stages},
+        }
+
+
+class Registry:
+    def __init__(self, max_spans: int = 50):
+        self._metrics: dict[str, object] = {}
+        self.spans: collections.deque[Span] = collections.deque(maxlen=max_spans)
+        self.tracing = True
+
+    def _get(self, cls, name, *args, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, *args, **kwargs)
+        return metric
+
+    def counter(self, name: str, help: str = "") -> Counter:
+        return self._get(Counter, name, help)
+
+    def gauge(self, name: str, help: str = "", fn=None) -> Gauge:
+        return self._get(Gauge, name, help, fn)
+
+    def histogram(
+        self, name: str, help: str = "", buckets=DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._get(Histogram, name, help, buckets)
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attrs):
+        """スパンを記録する。処理全体の時間は {name}_seconds ヒストグラムにも入る。"""
+        span = Span(name, **attrs)
+        try:
+            yield span
+        finally:
+            span.duration = time.perf_counter() - span._t0
+            self.histogram(
+                f"{name.replace('-', '_')}_seconds", f"{name} の所要時間"
+            ).observe(span.duration)
+            if self.tracing:
+                self.spans.append(span)
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, key, value in metric.samples():
+                lines.append(f"{name}{_fmt_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        return {
+            "time": time.time(),
+            "metrics": {name: m.snapshot() for name, m in self._metrics.items()},
+            "spans": [s.as_dict() for s in self.spans],
+        }
+
+
+registry = Registry()
+
+
+async def serve(host: str, port: int):
+    """Prometheus 形式 (/metrics) と JSON (/metrics.json) を返す HTTP サーバを起動する。"""
+    from aiohttp import web
+
+    async def prometheus(_request):
+        return web.Response(
+            text=registry.render_prometheus(), content_type="text/plain"
+        )
+
+    async def as_json(_request):
+        return web.json_response(registry.snapshot())
+
+    app = web.Application()
+    app.router.add_get("/metrics", prometheus)
+    app.router.add_get("/metrics.json", as_json)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"メトリクスを http://{host}:{port}/metrics で公開しています")
+    return runner
+
+
+async def dump_loop(path: pathlib.Path, interval: float):
+    """interval 秒ごとに JSON スナップショットを path に書き出す。"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            tmp = path.with_suffix(path.suffix + ".tmp")
+            tmp.write_text(json.dumps(registry.snapshot(), ensure_ascii=False))
+            tmp.replace(path)
+        except Exception as e:
+            print("メトリクスの書き出しエラー:", e)
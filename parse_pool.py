@@ -0,0 +1,99 @@
+import asyncio
+import concurrent.futures
+import functools
+import time
+
+from metrics import registry
+
+PARSE_SECONDS = registry.histogram(
+    "parse_seconds", "解析ワーカーでの処理時間（キュー待ちを含む）"
+)
+
+
+class ParsePool:
+    """
+    HTML 解析・Markdown 変換をイベントループの外で実行するためのワーカープール。
+    kind は "thread"（既定）か "process"。process の場合、渡す関数と引数は pickle 可能であること。
+    """
+
+    def __init__(self, kind: str = "thread", workers: int = 2):
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.stats = {"tasks": 0, "errors": 0, "busy_seconds": 0.0, "max_seconds": 0.0}
+        if kind == "process":
+            self._executor = concurrent.futures.ProcessPoolExecutor(self.workers)
+        else:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                self.workers, thread_name_prefix="parse"
+            )
+
+    async def run(self, fn, *args, **kwargs):
+        """fn(*args, **kwargs) をワーカーで実行して結果を返す。"""
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            return await loop.run_in_executor(
+                self._executor, functools.partial(fn, *args, **kwargs)
+            )
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.stats["tasks"] += 1
+            self.stats["busy_seconds"] += elapsed
+            self.stats["max_seconds"] = max(self.stats["max_seconds"], elapsed)
+            PARSE_SECONDS.observe(elapsed, fn=getattr(fn, "__name__", "task"))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+LOOP_LAG_SECONDS = registry.histogram(
+    "event_loop_lag_seconds",
+    "イベントループが予定より遅れて起きた時間",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+
+class LoopLagMonitor:
+    """
+    一定間隔で sleep し、予定より遅れて起きた時間をイベントループのブロック時間として記録する。
+    warn_after を超えるブロックはログに出す。
+    """
+
+    def __init__(self, interval: float = 0.5, warn_after: float = 0.25):
+        self.interval = interval
+        self.warn_after = warn_after
+        self.stats = {
+            "samples": 0,
+            "blocked_seconds": 0.0,
+            "max_lag": 0.0,
+            "last_lag": 0.0,
+            "over_threshold": 0,
+        }
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self.stats["samples"] += 1
+            self.stats["blocked_seconds"] += lag
+            self.stats["last_lag"] = lag
+            self.stats["max_lag"] = max(self.stats["max_lag"], lag)
+            LOOP_LAG_SECONDS.observe(lag)
+            if lag >= self.warn_after:
+                self.stats["over_threshold"] += 1
+                print(f"イベントループが {lag * 1000:.0f}ms ブロックされました")
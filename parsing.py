@@ -0,0 +1,230 @@
+"""
+AtCoder のページ解析（HTML → リンク一覧・投稿エントリ・Markdown）。
+ここの関数はイベントループ外のワーカー（スレッド／プロセス）で実行するため、
+引数と戻り値だけでやり取りするモジュールレベルの関数にしておく。
+"""
+
+import datetime
+import os
+import re
+from typing import TYPE_CHECKING
+
+import extract
+import render
+from classify import classifier
+from records import Contest, Post
+
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+
+# 投稿ページ等の取得先（ベンチマークではローカルのスタンドインサーバに向ける）
+BASE_URL = os.getenv("ATCODER_BASE", "https://atcoder.jp").rstrip("/")
+
+
+def find_contest_panel(soup: "BeautifulSoup"):
+    """
+    『直近のコンテストの告知』パネルを探す。見出しテキストやidを手がかりに柔軟に探索する。
+    extract.panel_post_links で見つからなかったときの BeautifulSoup 版フォールバック。
+    """
+    for heading in soup.find_all(("h1", "h2", "h3")):
+        if extract.PANEL_HEADING in heading.get_text():
+            panels = [
+                div
+                for div in heading.find_parents("div")
+                if "panel" in (div.get("class") or [])
+            ]
+            if panels:
+                return panels[-1]
+
+    panel = soup.find("div", id="contest-table-upcoming")
+    if panel:
+        return panel
+
+    text_node = soup.find(string=lambda s: s and "直近のコンテストの告知" in s)
+    if text_node and hasattr(text_node, "parent"):
+        return text_node.parent
+
+    return None
+
+
+def abs_url(href: str) -> str:
+    return href if href.startswith("http") else f"{BASE_URL}{href}"
+
+
+def find_contest_url(node: "BeautifulSoup") -> str | None:
+    """
+    指定ノード内から /contests/{slug} のURLを抽出して返す（ルート /contests/ は除外）。
+    まず <a> の href を走査、なければプレーンテキストのURLを検索。
+    """
+    # 1) aタグのhrefを優先（出現順）
+    for a in node.find_all("a", href=True):
+        h = a["href"]
+        m = re.search(r"/contests/([A-Za-z0-9_\-]+)/?", h)
+        if m:
+            return abs_url(h)
+    # 2) プレーンテキストから抽出
+    text = node.get_text(" ", strip=True)
+    m2 = re.search(r"https?://atcoder\.jp/contests/([A-Za-z0-9_\-]+)/?", text)
+    if m2:
+        return m2.group(0)
+    return None
+
+
+def post_id(post_url: str) -> str:
+    return post_url.rstrip("/").split("/")[-1]
+
+
+def render_post(post_html: str) -> tuple[str, str | None]:
+    """
+    投稿ページの本文を Markdown に変換し、本文中のコンテストURLと共に返す。
+    変換結果は本文 HTML のハッシュでメモ化されており、同じ本文ならパースもしない。
+    """
+    fragment = extract.body_fragment(post_html)
+    if fragment is not None:
+        contest_url = extract.find_contest_url(fragment)
+        key = render.content_key(fragment)
+        text = render.memo_get(key)
+        if text is None:
+            # 本文 div の断片だけをパースする
+            soup = extract.make_soup(fragment)
+            text = render.render_node(soup.find("div"))
+            soup.decompose()
+            render.memo_put(key, text)
+        return text, contest_url
+
+    key = render.content_key(post_html)
+    psoup = extract.make_soup(post_html)
+    body = psoup.select_one("div.panel-body.blog-post") or psoup.select_one(
+        "div.panel-body"
+    )
+    # 本文から /contests/{slug} のURLを抽出（ルート /contests/ は除外）
+    contest_url = find_contest_url(body or psoup)
+    text = render.memo_get(key)
+    if text is None:
+        text = render.render_node(body)
+        render.memo_put(key, text)
+    psoup.decompose()
+    return text, contest_url
+
+
+def parse_post(post_url: str, title: str, post_html: str, with_text: bool) -> Post:
+    """
+    投稿ページからキャッシュ用の Post を作る。
+    コンテストスラッグの抽出とシリーズ判定は本文 div（切り出せなければページ全体）への
+    classifier.scan 1 回で行い、Markdown 変換は with_text=True のときだけ行う。
+    ナビゲーションなど本文の外にある /contests/ リンクで告知と誤判定しないよう本文だけを見る。
+    """
+    found = classifier.scan(extract.body_fragment(post_html) or post_html)
+    slugs = [slug for slug, _ in found]
+    entry = Post(
+        post_id(post_url),
+        post_url,
+        title,
+        slugs,
+        classifier.series_of(found),
+        f"https://atcoder.jp/contests/{slugs[0]}" if slugs else None,
+    )
+    if with_text and slugs:
+        text, contest_url = render_post(post_html)
+        entry.text = text
+        entry.contest_url = contest_url or entry.contest_url
+    return entry
+
+
+def parse_archived_post(post_url: str, post_html: str) -> Post:
+    """埋め戻し用。タイトルも投稿ページから取り、告知なら本文まで変換する。"""
+    title = extract.page_title(post_html) or f"/posts/{post_id(post_url)}"
+    return parse_post(post_url, title, post_html, with_text=True)
+
+
+def _dedupe_links(links: list[tuple[str, str]]) -> list[tuple[str, str]]:
+    seen = set()
+    post_hrefs = []
+    for title, href in links:
+        if href and href not in seen:
+            seen.add(href)
+            post_hrefs.append((title or "Announcement", abs_url(href)))
+    return post_hrefs
+
+
+def contest_panel_links(html_text: str) -> list[tuple[str, str]] | None:
+    """
+    『直近のコンテストの告知』パネル内の投稿リンクを新しい順に (title, post_url) で返す。
+    パネルが見つからなければ None。対象限定モードで探し、だめなら BeautifulSoup で探し直す。
+    """
+    links = extract.panel_post_links(html_text)
+    if links is None:
+        soup = extract.make_soup(html_text)
+        panel = find_contest_panel(soup)
+        if panel:
+            links = [
+                (a.get_text(strip=True), a["href"])
+                for a in panel.find_all(
+                    "a", href=lambda h: h and h.startswith("/posts/")
+                )
+            ]
+        # 木は相互参照だらけなので、リンクを取り出したらすぐに壊して手放す
+        soup.decompose()
+        if links is None:
+            return None
+    return _dedupe_links(links)
+
+
+def panel_post_links(html_text: str) -> list[tuple[str, str]]:
+    """パネル内の投稿リンク。パネルに無ければページ全体の投稿リンクを返す。"""
+    return contest_panel_links(html_text) or page_post_links(html_text)
+
+
+def page_post_links(html_text: str) -> list[tuple[str, str]]:
+    soup = extract.make_soup(html_text)
+    links = [
+        (a.get_text(strip=True), a["href"])
+        for a in soup.find_all("a", href=lambda h: h and h.startswith("/posts/"))
+    ]
+    soup.decompose()
+    return _dedupe_links(links)
+
+
+def _parse_start(text: str) -> float | None:
+    try:
+        return datetime.datetime.strptime(text, "%Y-%m-%d %H:%M:%S%z").timestamp()
+    except ValueError:
+        return None
+
+
+def _parse_duration(text: str) -> int:
+    """'01:40' や '240:00'（時間:分）を秒にする。"""
+    hours, _, minutes = text.partition(":")
+    if hours.isdigit() and minutes.isdigit():
+        return int(hours) * 3600 + int(minutes) * 60
+    return 0
+
+
+def contest_timetable(html_text: str) -> list[Contest]:
+    """
+    /contests/ の開催中・予定されたコンテストを開始時刻順に Contest で返す。
+    series は classifier で判定したシリーズ名（無ければ空文字）、status は "action" / "upcoming"。
+    """
+    contests = []
+    for table, cells, href, name in extract.contest_table_rows(
+        html_text, ("action", "upcoming")
+    ):
+        if not href or len(cells) < 3:
+            continue
+        start = _parse_start(cells[0])
+        if start is None:
+            continue
+        slug = href.rstrip("/").split("/")[-1].lower()
+        contests.append(
+            Contest(
+                slug,
+                name or cells[1],
+                classifier.classify(slug),
+                start,
+                _parse_duration(cells[2]),
+                cells[3] if len(cells) > 3 else "",
+                table,
+            )
+        )
+    contests.sort(key=lambda c: c.start)
+    return contests
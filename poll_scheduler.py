@@ -0,0 +1,107 @@
+import random
+import time
+
+JST_OFFSET = 9 * 3600
+HOURS_PER_WEEK = 7 * 24
+
+
+def _hour_of_week(t: float) -> int:
+    """JST の (曜日, 時) を 0..167 の番号にする。"""
+    tm = time.gmtime(t + JST_OFFSET)
+    return tm.tm_wday * 24 + tm.tm_hour
+
+
+class PollScheduler:
+    """
+    /home のポーリング間隔を決める。
+
+    - 予定コンテストの開始 hot_before 秒前から終了 hot_after 秒後まで、および
+      過去に新しい告知を検知した時間帯（JST の曜日×時、減衰付きで学習）は min_interval で回す
+    - それ以外は base で回し、新しい告知の無いポーリングが 3 回続くごとに倍にして max_interval で頭打ち。
+      ただし次の注目時間帯の開始を越えて眠らない
+    - エラー時は指数バックオフし、Retry-After があればそれより早くは再取得しない
+    - どの間隔にも ±jitter の揺らぎを入れる
+    """
+
+    def __init__(
+        self,
+        base: float = 300,
+        min_interval: float = 30,
+        max_interval: float = 1800,
+        jitter: float = 0.1,
+        hot_before: float = 900,
+        hot_after: float = 1800,
+        learn_decay: float = 0.98,
+        hour_weights: list[float] | None = None,
+    ):
+        self.base = base
+        self.min_interval = min(min_interval, base)
+        self.max_interval = max(max_interval, base)
+        self.jitter = jitter
+        self.hot_before = hot_before
+        self.hot_after = hot_after
+        self.learn_decay = learn_decay
+        self.hour_weights = list(hour_weights or [0.0] * HOURS_PER_WEEK)
+        self.windows: list[tuple[float, float]] = []
+        self.errors = 0
+        self.idle = 0
+        self.retry_at = 0.0
+
+    def set_contests(self, contests):
+        """records.Contest（start, duration を持つもの）の一覧から注目時間帯を作り直す。"""
+        self.windows = sorted(
+            (c.start - self.hot_before, c.start + c.duration + self.hot_after)
+            for c in contests
+        )
+
+    def record_new(self, now: float | None = None):
+        """新しい告知を検知した。その時間帯の重みを学習する。"""
+        now = time.time() if now is None else now
+        self.hour_weights = [w * self.learn_decay for w in self.hour_weights]
+        self.hour_weights[_hour_of_week(now)] += 1.0
+        self.errors = 0
+        self.idle = 0
+
+    def record_idle(self):
+        self.errors = 0
+        self.idle += 1
+
+    def record_error(self, retry_after: float | None = None, now: float | None = None):
+        now = time.time() if now is None else now
+        self.errors += 1
+        if retry_after:
+            self.retry_at = max(self.retry_at, now + retry_after)
+
+    def is_hot(self, t: float) -> bool:
+        if self.hour_weights[_hour_of_week(t)] >= 0.5:
+            return True
+        return any(start <= t <= end for start, end in self.windows)
+
+    def _until_hot(self, now: float, horizon: float) -> float:
+        """now から horizon 秒以内に注目時間帯が始まるなら、その開始までの秒数。無ければ horizon。"""
+        for start, end in self.windows:
+            if end >= now:
+                if start - now < horizon:
+                    horizon = max(0.0, start - now)
+                break
+        # 学習した時間帯は 1 時間刻みで先を見る
+        hour_start = now - (now + JST_OFFSET) % 3600
+        t = hour_start + 3600
+        while t - now < horizon:
+            if self.hour_weights[_hour_of_week(t)] >= 0.5:
+                return t - now
+            t += 3600
+        return horizon
+
+    def next_delay(self, now: float | None = None) -> float:
+        """次のポーリングまでの秒数。"""
+        now = time.time() if now is None else now
+        if self.errors:
+            delay = min(self.max_interval, self.base * 2 ** (self.errors - 1))
+        elif self.is_hot(now):
+            delay = self.min_interval
+        else:
+            delay = min(self.max_interval, self.base * 2 ** min(self.idle // 3, 16))
+            delay = max(self.min_interval, self._until_hot(now, delay))
+        delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return max(delay, self.retry_at - now, 1.0)
@@ -0,0 +1,118 @@
+import collections
+import json
+import time
+
+from records import Post
+from state_store import connect
+
+
+class PostCache:
+    """
+    投稿 ID をキーにした解析済み投稿のキャッシュ。
+    メモリ上は件数上限付きの LRU、裏側に SQLite を持ち再起動後も残る。
+    TTL を過ぎたエントリは取得時に捨てる。
+    ヒット時の最終アクセス時刻はメモリに溜め、put() / flush() でまとめて書き込む。
+
+    エントリは records.Post（ディスク上は to_dict() の JSON）。
+    """
+
+    def __init__(self, path, max_entries: int = 512, ttl: float = 7 * 24 * 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._mem: collections.OrderedDict[str, Post] = collections.OrderedDict()
+        self._touched: dict[str, float] = {}
+        self._db = connect(path)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS posts (
+                post_id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """)
+        self._db.commit()
+
+    def _expired(self, entry: Post, now: float) -> bool:
+        return self.ttl > 0 and now - entry.fetched_at > self.ttl
+
+    def get(self, post_id: str) -> Post | None:
+        now = time.time()
+        entry = self._mem.get(post_id)
+        if entry is None:
+            row = self._db.execute(
+                "SELECT data FROM posts WHERE post_id = ?", (post_id,)
+            ).fetchone()
+            if row:
+                entry = Post.from_dict(json.loads(row[0]))
+        if entry is None or self._expired(entry, now):
+            if entry is not None:
+                self.delete(post_id)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._remember(post_id, entry)
+        self._touched[post_id] = now
+        return entry
+
+    def put(self, entry: Post):
+        now = time.time()
+        if entry.fetched_at is None:
+            entry.fetched_at = now
+        post_id = entry.post_id
+        self._remember(post_id, entry)
+        self._db.execute(
+            "INSERT OR REPLACE INTO posts (post_id, data, fetched_at, accessed_at) "
+            "VALUES (?, ?, ?, ?)",
+            (
+                post_id,
+                json.dumps(entry.to_dict(), ensure_ascii=False),
+                entry.fetched_at,
+                now,
+            ),
+        )
+        self._touched.pop(post_id, None)
+        self._write_touched()
+        # ディスク側も件数上限を超えた分は最終アクセスが古い順に捨てる
+        self._db.execute(
+            "DELETE FROM posts WHERE post_id NOT IN "
+            "(SELECT post_id FROM posts ORDER BY accessed_at DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+        self._db.commit()
+
+    def flush(self):
+        if self._touched:
+            self._write_touched()
+            self._db.commit()
+
+    def _write_touched(self):
+        self._db.executemany(
+            "UPDATE posts SET accessed_at = ? WHERE post_id = ?",
+            [(at, post_id) for post_id, at in self._touched.items()],
+        )
+        self._touched.clear()
+
+    def delete(self, post_id: str):
+        self._mem.pop(post_id, None)
+        self._touched.pop(post_id, None)
+        self._db.execute("DELETE FROM posts WHERE post_id = ?", (post_id,))
+        self._db.commit()
+
+    def clear(self):
+        self._mem.clear()
+        self._touched.clear()
+        self._db.execute("DELETE FROM posts")
+        self._db.commit()
+
+    def _remember(self, post_id: str, entry: Post):
+        self._mem[post_id] = entry
+        self._mem.move_to_end(post_id)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    def close(self):
+        self.flush()
+        self._db.close()
@@ -0,0 +1,173 @@
+"""
+メモリ上に長く持つレコード（投稿・コンテスト・配信先）。
+キャッシュや索引に数百件単位で載るので、__slots__ で属性辞書を持たせず、
+スラッグ・シリーズ名・投稿 ID は sys.intern で同じ文字列を共有させる。
+SQLite / kv には to_dict() の JSON で保存し、from_dict() で戻す。
+"""
+
+import sys
+
+_intern = sys.intern
+
+
+class Post:
+    """
+    解析済みの投稿。slugs は本文中の /contests/{slug}（出現順）、series はそのシリーズ名（ルール表の順）。
+    text は Markdown（未レンダリングなら None）。
+    """
+
+    __slots__ = (
+        "post_id",
+        "post_url",
+        "title",
+        "slugs",
+        "series",
+        "contest_url",
+        "text",
+        "fetched_at",
+    )
+
+    def __init__(
+        self,
+        post_id: str,
+        post_url: str,
+        title: str,
+        slugs=(),
+        series=(),
+        contest_url: str | None = None,
+        text: str | None = None,
+        fetched_at: float | None = None,
+    ):
+        self.post_id = _intern(post_id)
+        self.post_url = post_url
+        self.title = title
+        self.slugs = tuple(_intern(slug) for slug in slugs)
+        self.series = tuple(_intern(name) for name in series)
+        self.contest_url = contest_url
+        self.text = text
+        self.fetched_at = fetched_at
+
+    @property
+    def is_contest(self) -> bool:
+        return bool(self.slugs)
+
+    def __reduce__(self):
+        # process ワーカーから戻すときも __init__ を通して intern し直す
+        return (Post, tuple(getattr(self, name) for name in Post.__slots__))
+
+    def to_dict(self) -> dict:
+        return {
+            "post_id": self.post_id,
+            "post_url": self.post_url,
+            "title": self.title,
+            "slugs": list(self.slugs),
+            "series": list(self.series),
+            "is_contest": self.is_contest,
+            "contest_url": self.contest_url,
+            "text": self.text,
+            "fetched_at": self.fetched_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Post":
+        return cls(
+            data["post_id"],
+            data["post_url"],
+            data["title"],
+            data.get("slugs") or (),
+            data.get("series") or (),
+            data.get("contest_url"),
+            data.get("text"),
+            data.get("fetched_at"),
+        )
+
+    def __repr__(self) -> str:
+        return f"Post({self.post_id!r}, series={self.series!r})"
+
+
+class Contest:
+    """
+    時刻表の 1 行。start は epoch 秒、duration は秒、status は "action" / "upcoming"。
+    status は表示用で、同じコンテストかどうか（== / hash）の比較には含めない。
+    """
+
+    __slots__ = ("slug", "title", "series", "start", "duration", "rated", "status")
+
+    def __init__(
+        self,
+        slug: str,
+        title: str,
+        series: str,
+        start: float,
+        duration: int,
+        rated: str = "",
+        status: str = "",
+    ):
+        self.slug = _intern(slug)
+        self.title = title
+        self.series = _intern(series)
+        self.start = start
+        self.duration = duration
+        self.rated = _intern(rated)
+        self.status = _intern(status)
+
+    def _key(self) -> tuple:
+        return (
+            self.slug,
+            self.title,
+            self.series,
+            self.start,
+            self.duration,
+            self.rated,
+        )
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Contest):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __hash__(self) -> int:
+        # __eq__ と同じ項目から作る（status だけが違うものは同じハッシュ）
+        return hash(self._key())
+
+    def __reduce__(self):
+        return (Contest, tuple(getattr(self, name) for name in Contest.__slots__))
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in Contest.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Contest":
+        return cls(
+            data["slug"],
+            data["title"],
+            data.get("series") or "",
+            data["start"],
+            data["duration"],
+            data.get("rated") or "",
+            data.get("status") or "",
+        )
+
+    def __repr__(self) -> str:
+        return f"Contest({self.slug!r}, start={self.start!r})"
+
+
+class Subscription:
+    """配信先の登録 1 行。series="*" は全告知。"""
+
+    __slots__ = ("guild_id", "channel_id", "series", "role_id")
+
+    def __init__(
+        self,
+        guild_id: int | None,
+        channel_id: int,
+        series: str,
+        role_id: int | None = None,
+    ):
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.series = _intern(series)
+        self.role_id = role_id
+
+    def __repr__(self) -> str:
+        return f"Subscription({self.channel_id!r}, {self.series!r})"
@@ -0,0 +1,95 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+
+class ReminderScheduler:
+    """
+    リマインダの時刻管理。1 本のタスクがヒープの先頭の時刻まで眠り、時刻が来たものから
+    fire(key, payload) を呼ぶ（リマインダごとにタスクは作らない）。
+
+    schedule() は同じ key の予定を置き換える。置き換え・取り消された古いヒープ要素は
+    取り出したときに捨てる（遅延削除）。予定が入るたびに眠りを起こして先頭を見直すので、
+    遅れは asyncio の sleep の精度程度に収まる。
+    """
+
+    def __init__(self, fire):
+        self.fire = fire
+        self._heap: list[tuple[float, int, str]] = []
+        self._entries: dict[str, tuple[float, int, object]] = {}
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._firing: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def schedule(self, key: str, fire_at: float, payload=None):
+        current = self._entries.get(key)
+        if current is not None and current[0] == fire_at:
+            self._entries[key] = (fire_at, current[1], payload)
+            return
+        seq = next(self._seq)
+        self._entries[key] = (fire_at, seq, payload)
+        heapq.heappush(self._heap, (fire_at, seq, key))
+        if self._heap[0][1] == seq:
+            self._wakeup.set()
+
+    def cancel(self, key: str):
+        self._entries.pop(key, None)
+
+    def keys(self) -> set[str]:
+        return set(self._entries)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _pop_due(self, now: float) -> list[tuple[str, object]]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            fire_at, seq, key = heapq.heappop(self._heap)
+            entry = self._entries.get(key)
+            if entry is None or entry[1] != seq:
+                continue  # 置き換え・取り消し済み
+            del self._entries[key]
+            due.append((key, entry[2]))
+        return due
+
+    def _next_delay(self, now: float) -> float | None:
+        while self._heap:
+            fire_at, seq, key = self._heap[0]
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == seq:
+                return max(0.0, fire_at - now)
+            heapq.heappop(self._heap)
+        return None
+
+    async def _run(self):
+        while True:
+            for key, payload in self._pop_due(time.time()):
+                task = asyncio.create_task(self._fire(key, payload))
+                self._firing.add(task)
+                task.add_done_callback(self._firing.discard)
+            self._wakeup.clear()
+            delay = self._next_delay(time.time())
+            if delay is not None:
+                # 壁時計とのずれ（スリープ復帰など）を拾うため長くても 1 分で見直す
+                delay = min(delay, 60.0)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire(self, key: str, payload):
+        try:
+            await self.fire(key, payload)
+        except Exception as e:
+            print(f"リマインダの送信エラー {key}:", e)
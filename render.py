@@ -0,0 +1,94 @@
+"""
+告知本文のレンダリングパイプライン（本文ノード → Markdown → 画像除去 → /users/ リンク絶対化）。
+出力は本文 HTML のハッシュでメモ化し、同じ内容を二度変換しない。
+"""
+
+import collections
+import functools
+import hashlib
+import re
+import threading
+
+from metrics import registry
+
+# 分割するときの 1 ページ（embed の description）の上限。Discord の上限は 4096 だが、
+# 1 メッセージの embed 合計 6000 文字に 2 ページ収まるようにしておく
+EMBED_PAGE_LIMIT = 2800
+
+_IMG_RE = re.compile(r"!\[[^\]]*\]\([^)]*\)\s*")
+_USER_LINK_RE = re.compile(r"\((/users/[^)]*)\)")
+
+
+@functools.lru_cache(maxsize=None)
+def _converter():
+    """markdownify（と bs4）は最初の変換のときに読み込む。"""
+    from markdownify import MarkdownConverter
+
+    return MarkdownConverter(strip=["span", "time", "div"])
+
+
+_MEMO_SIZE = 256
+_memo: collections.OrderedDict[str, str] = collections.OrderedDict()
+_memo_lock = threading.Lock()
+stats = {"hits": 0, "misses": 0}
+
+# process ワーカーで変換した場合はワーカー側で記録されるため、親プロセスには現れない
+MARKDOWN_SECONDS = registry.histogram("markdown_seconds", "本文の Markdown 変換時間")
+
+
+def content_key(body_html: str) -> str:
+    return hashlib.sha1(body_html.encode("utf-8")).hexdigest()
+
+
+def memo_get(key: str) -> str | None:
+    with _memo_lock:
+        text = _memo.get(key)
+        if text is None:
+            stats["misses"] += 1
+            return None
+        stats["hits"] += 1
+        _memo.move_to_end(key)
+        return text
+
+
+def memo_put(key: str, text: str):
+    with _memo_lock:
+        _memo[key] = text
+        _memo.move_to_end(key)
+        while len(_memo) > _MEMO_SIZE:
+            _memo.popitem(last=False)
+
+
+def memo_clear():
+    with _memo_lock:
+        _memo.clear()
+
+
+def render_node(node) -> str:
+    """パース済みの本文ノードを直接 Markdown に変換する（文字列への再シリアライズはしない）。"""
+    if node is None:
+        return ""
+    with MARKDOWN_SECONDS.time():
+        text = _converter().convert_soup(node)
+    text = _IMG_RE.sub("", text)
+    return _USER_LINK_RE.sub(r"(https://atcoder.jp\1)", text).strip()
+
+
+def split_text(text: str, limit: int = EMBED_PAGE_LIMIT) -> list[str]:
+    """
+    長い本文を limit 文字以下のページに分ける（切り詰めない）。
+    段落 → 行 → 文字の順で切れ目を探す。
+    """
+    pages = []
+    rest = text.strip()
+    while len(rest) > limit:
+        cut = rest.rfind("\n\n", 0, limit + 1)
+        if cut <= 0:
+            cut = rest.rfind("\n", 0, limit + 1)
+        if cut <= 0:
+            cut = limit
+        pages.append(rest[:cut].rstrip())
+        rest = rest[cut:].lstrip("\n")
+    if rest:
+        pages.append(rest)
+    return pages
@@ -0,0 +1,57 @@
+from records import Post
+
+
+class SeriesIndex:
+    """
+    シリーズ（abc/arc/agc/ahc ...）→ 直近の告知 のメモリ上の索引。
+    ポーリングループが新しい投稿 ID を見つけるたびに差分更新し、
+    /contest-info はここから即答する。
+    """
+
+    def __init__(self):
+        self.ready = False
+        self._latest: dict[str, Post] = {}
+        self._seen_ids: set[str] = set()
+
+    def get(self, series: str) -> Post | None:
+        return self._latest.get(series)
+
+    def is_seen(self, post_id: str) -> bool:
+        return post_id in self._seen_ids
+
+    def mark_seen(self, post_id: str):
+        self._seen_ids.add(post_id)
+
+    def wants(self, series: str, post_id: str) -> bool:
+        """post_id が索引中の series の告知より新しければ True。"""
+        current = self._latest.get(series)
+        return current is None or _is_newer(post_id, current.post_id)
+
+    def update(self, series: str, data: Post) -> bool:
+        """data が現在の索引より新しければ差し替える。"""
+        if not self.wants(series, data.post_id):
+            return False
+        self._latest[series] = data
+        return True
+
+    def series(self) -> list[str]:
+        return sorted(self._latest)
+
+    def snapshot(self) -> dict[str, dict]:
+        """kv に保存する形（restore() で戻す）。"""
+        return {series: data.to_dict() for series, data in self._latest.items()}
+
+    def restore(self, latest: dict[str, dict]):
+        """
+        保存しておいた索引を読み込む（ready にはしない）。
+        ポーリングで作り直すまでの間、少し古い答えを即座に返すためのもの。
+        """
+        for series, data in latest.items():
+            self.update(series, Post.from_dict(data))
+
+
+def _is_newer(post_id: str, other: str) -> bool:
+    # AtCoder の投稿 ID は連番なので数値比較で新旧を判定する
+    if post_id.isdigit() and other.isdigit():
+        return int(post_id) > int(other)
+    return post_id != other
@@ -0,0 +1,65 @@
+import asyncio
+import time
+
+from metrics import registry
+
+COALESCED = registry.counter(
+    "singleflight_total",
+    "同じ処理の呼び出し（result=run: 実行 / shared: 実行中に相乗り / reused: 直前の結果を再利用）",
+)
+
+
+class SingleFlight:
+    """
+    同じ key の処理を同時に 1 本だけ走らせ、待っている呼び出し全員で結果を分け合う。
+    成功した結果は ttl 秒のあいだ使い回す（例外は使い回さず、次の呼び出しで実行し直す）。
+
+    処理は呼び出し側とは別のタスクで動くので、一人がキャンセルしても他の待ち手には影響しない。
+    待ち手が全員キャンセルされたら、結果を待つ人がいないので処理もキャンセルする。
+    """
+
+    def __init__(self, name: str, ttl: float = 0.0):
+        self.name = name
+        self.ttl = ttl
+        self._inflight: dict[object, asyncio.Task] = {}
+        self._results: dict[object, tuple[float, object]] = {}
+        self._waiters: dict[asyncio.Task, int] = {}
+
+    async def do(self, key, fn, *args):
+        hit = self._results.get(key)
+        if hit is not None and hit[0] > time.monotonic():
+            COALESCED.inc(name=self.name, result="reused")
+            return hit[1]
+        task = self._inflight.get(key)
+        if task is None:
+            COALESCED.inc(name=self.name, result="run")
+            task = asyncio.create_task(fn(*args))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            COALESCED.inc(name=self.name, result="shared")
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters[task] == 1:
+                task.cancel()
+            raise
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+
+    def forget(self, key):
+        self._results.pop(key, None)
+
+    def _done(self, key, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if task.cancelled() or task.exception() is not None or self.ttl <= 0:
+            return
+        now = time.monotonic()
+        self._results[key] = (now + self.ttl, task.result())
+        if len(self._results) > 256:
+            # 期限切れを掃除する
+            self._results = {k: v for k, v in self._results.items() if v[0] > now}
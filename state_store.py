@@ -0,0 +1,205 @@
+import sqlite3
+import time
+
+SENT = "sent"
+PENDING = "pending"
+FAILED = "failed"
+
+
+def connect(path) -> sqlite3.Connection:
+    """状態 DB への接続。WAL にしておき、読み手を書き込みで止めない。"""
+    db = sqlite3.connect(str(path), timeout=10)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    return db
+
+
+class StateStore:
+    """
+    ポーラーの永続状態（SQLite / WAL）。
+      kv: 前回の状態（contest:ID / hash:H）・条件付き GET の validators・前回本文の長さ
+      seen_posts: 処理済みの投稿 ID（古いものから捨てて max_seen 件までに抑える）
+      deliveries: (投稿, チャンネル) ごとの配信記録（pending / sent / failed）。
+                  sent / failed は delivery_retention 秒を過ぎたら捨てる（pending は送り直すまで残す）
+
+    起動時に全件をメモリに読み込み、読み出しはメモリから行う。
+    書き込みは値が変わったものだけを溜めておき、flush() で 1 トランザクションにまとめて書く。
+    """
+
+    def __init__(
+        self, path, max_seen: int = 1000, delivery_retention: float = 30 * 86400
+    ):
+        self.max_seen = max_seen
+        self.delivery_retention = delivery_retention
+        self._db = connect(path)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS kv (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            CREATE TABLE IF NOT EXISTS seen_posts (
+                post_id TEXT PRIMARY KEY,
+                seen_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS deliveries (
+                post_id TEXT NOT NULL,
+                channel_id INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (post_id, channel_id)
+            );
+            """)
+        self._load()
+
+    def _load(self):
+        self._kv: dict[str, str | None] = dict(
+            self._db.execute("SELECT key, value FROM kv")
+        )
+        # 挿入順 = 処理した順。溢れたら先頭から捨てる
+        self._seen: dict[str, float] = dict(
+            self._db.execute("SELECT post_id, seen_at FROM seen_posts ORDER BY seen_at")
+        )
+        self._deliveries: dict[tuple[str, int], str] = {}
+        self._delivery_at: dict[tuple[str, int], float] = {}
+        for post_id, channel_id, status, updated_at in self._db.execute(
+            "SELECT post_id, channel_id, status, updated_at FROM deliveries "
+            "WHERE status = ? OR updated_at >= ?",
+            (PENDING, time.time() - self.delivery_retention),
+        ):
+            self._deliveries[(post_id, channel_id)] = status
+            self._delivery_at[(post_id, channel_id)] = updated_at
+        self._dirty_kv: set[str] = set()
+        self._dirty_seen: set[str] = set()
+        self._evicted: set[str] = set()
+        self._dirty_deliveries: set[tuple[str, int]] = set()
+        self._data_version = self._data_version_now()
+
+    def _data_version_now(self) -> int:
+        return self._db.execute("PRAGMA data_version").fetchone()[0]
+
+    # --- kv ---
+
+    def get(self, key: str, default=None):
+        return self._kv.get(key, default)
+
+    def set(self, key: str, value):
+        value = None if value is None else str(value)
+        if self._kv.get(key) != value:
+            self._kv[key] = value
+            self._dirty_kv.add(key)
+
+    # --- 処理済み投稿 ---
+
+    def is_seen(self, post_id: str) -> bool:
+        return post_id in self._seen
+
+    def mark_seen(self, post_id: str):
+        if post_id in self._seen:
+            return
+        self._seen[post_id] = time.time()
+        self._dirty_seen.add(post_id)
+        self._evicted.discard(post_id)
+        while len(self._seen) > self.max_seen:
+            oldest = next(iter(self._seen))
+            del self._seen[oldest]
+            self._dirty_seen.discard(oldest)
+            self._evicted.add(oldest)
+
+    # --- 配信記録 ---
+
+    def delivery_status(self, post_id: str, channel_id: int) -> str | None:
+        return self._deliveries.get((post_id, channel_id))
+
+    def set_delivery(self, post_id: str, channel_id: int, status: str):
+        key = (post_id, channel_id)
+        if self._deliveries.get(key) != status:
+            self._deliveries[key] = status
+            self._delivery_at[key] = time.time()
+            self._dirty_deliveries.add(key)
+
+    def pending_deliveries(self) -> dict[str, list[int]]:
+        """送信前に落ちた可能性のある配信を {post_id: [channel_id]} で返す。"""
+        out: dict[str, list[int]] = {}
+        for (post_id, channel_id), status in self._deliveries.items():
+            if status == PENDING:
+                out.setdefault(post_id, []).append(channel_id)
+        return out
+
+    # --- 永続化 ---
+
+    @property
+    def dirty(self) -> bool:
+        return bool(
+            self._dirty_kv
+            or self._dirty_seen
+            or self._evicted
+            or self._dirty_deliveries
+        )
+
+    def flush(self):
+        """変更分だけを 1 トランザクションで書き込む。"""
+        if not self.dirty:
+            return
+        expired = self._expired_deliveries()
+        with self._db:
+            self._db.executemany(
+                "DELETE FROM seen_posts WHERE post_id = ?",
+                [(post_id,) for post_id in self._evicted],
+            )
+            self._db.executemany(
+                "INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)",
+                [(key, self._kv[key]) for key in self._dirty_kv],
+            )
+            self._db.executemany(
+                "INSERT OR IGNORE INTO seen_posts (post_id, seen_at) VALUES (?, ?)",
+                [(post_id, self._seen[post_id]) for post_id in self._dirty_seen],
+            )
+            self._db.executemany(
+                "INSERT OR REPLACE INTO deliveries "
+                "(post_id, channel_id, status, updated_at) VALUES (?, ?, ?, ?)",
+                [
+                    (*key, self._deliveries[key], self._delivery_at[key])
+                    for key in self._dirty_deliveries
+                ],
+            )
+            self._db.executemany(
+                "DELETE FROM deliveries WHERE post_id = ? AND channel_id = ?",
+                expired,
+            )
+        self._dirty_kv.clear()
+        self._dirty_seen.clear()
+        self._evicted.clear()
+        self._dirty_deliveries.clear()
+
+    def _expired_deliveries(self) -> list[tuple[str, int]]:
+        """保存期間を過ぎた sent / failed の記録をメモリから外し、その (投稿, チャンネル) を返す。"""
+        cutoff = time.time() - self.delivery_retention
+        expired = [
+            key
+            for key, status in self._deliveries.items()
+            if status != PENDING
+            and key not in self._dirty_deliveries
+            and self._delivery_at[key] < cutoff
+        ]
+        for key in expired:
+            del self._deliveries[key]
+            del self._delivery_at[key]
+        return expired
+
+    def reload(self):
+        """
+        書きかけを保存してから DB を読み直す（別プロセスが書いた状態を引き継ぐとき）。
+        """
+        self.flush()
+        self._load()
+
+    def reload_if_changed(self) -> bool:
+        """別のプロセスが前回の読み込み以降に DB へ書いていれば読み直して True を返す。"""
+        if self._data_version_now() == self._data_version:
+            return False
+        self.reload()
+        return True
+
+    def close(self):
+        self.flush()
+        self._db.close()
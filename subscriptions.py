@@ -0,0 +1,131 @@
+from records import Subscription
+from state_store import connect
+
+ALL_SERIES = "*"
+
+
+class SubscriptionRegistry:
+    """
+    配信先の登録簿。1 行 = (チャンネル, シリーズ) で、そのシリーズの告知をチャンネルへ送り、
+    role_id があればメンションする。series="*" は全告知を受け取る。
+    同じチャンネルに複数行あってもメッセージは 1 通にまとめ、該当する行のロールをすべてメンションする。
+
+    登録は SQLite に保存し、読み出しはメモリ上の dict から行う。
+    他のプロセスが同じ DB に書いたときは PRAGMA data_version の変化で気付いて読み直す。
+    環境変数由来の既定の配信先（TARGET_CHANNEL_ID / ABC_ROLE_ID）は add_default() でメモリにだけ載せる。
+    """
+
+    def __init__(self, path):
+        self._subs: dict[tuple[int, str], Subscription] = {}
+        self._defaults: dict[tuple[int, str], Subscription] = {}
+        self._db = connect(path)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS subscriptions (
+                guild_id INTEGER,
+                channel_id INTEGER NOT NULL,
+                series TEXT NOT NULL,
+                role_id INTEGER,
+                PRIMARY KEY (channel_id, series)
+            )
+            """)
+        self._db.commit()
+        self._load()
+
+    def _load(self):
+        self._subs = {
+            (channel_id, series): Subscription(guild_id, channel_id, series, role_id)
+            for guild_id, channel_id, series, role_id in self._db.execute(
+                "SELECT guild_id, channel_id, series, role_id FROM subscriptions"
+            )
+        }
+        self._data_version = self._data_version_now()
+
+    def _data_version_now(self) -> int:
+        return self._db.execute("PRAGMA data_version").fetchone()[0]
+
+    def _reload_if_changed(self):
+        # 別のプロセス（他のシャード）が登録を変えていれば読み直す
+        if self._data_version_now() != self._data_version:
+            self._load()
+
+    def add_default(
+        self, channel_id: int, series: str = ALL_SERIES, role_id: int | None = None
+    ):
+        self._defaults[(channel_id, series)] = Subscription(
+            None, channel_id, series, role_id
+        )
+
+    def subscribe(
+        self,
+        guild_id: int | None,
+        channel_id: int,
+        series: str = ALL_SERIES,
+        role_id: int | None = None,
+    ):
+        self._subs[(channel_id, series)] = Subscription(
+            guild_id, channel_id, series, role_id
+        )
+        self._db.execute(
+            "INSERT OR REPLACE INTO subscriptions (guild_id, channel_id, series, role_id) "
+            "VALUES (?, ?, ?, ?)",
+            (guild_id, channel_id, series, role_id),
+        )
+        self._db.commit()
+
+    def unsubscribe(self, channel_id: int, series: str | None = None) -> int:
+        """series を省略するとチャンネルの登録をすべて消す。消した件数を返す。"""
+        keys = [
+            k
+            for k in self._subs
+            if k[0] == channel_id and (series is None or k[1] == series)
+        ]
+        for k in keys:
+            del self._subs[k]
+        if series is None:
+            self._db.execute(
+                "DELETE FROM subscriptions WHERE channel_id = ?", (channel_id,)
+            )
+        else:
+            self._db.execute(
+                "DELETE FROM subscriptions WHERE channel_id = ? AND series = ?",
+                (channel_id, series),
+            )
+        self._db.commit()
+        return len(keys)
+
+    def for_channel(self, channel_id: int) -> list[Subscription]:
+        return [s for k, s in self._all().items() if k[0] == channel_id]
+
+    def targets(self, series: list[str] | None = None) -> dict[int, list[int]]:
+        """
+        告知の series に該当する配信先を {channel_id: [メンションするロール ID]} で返す。
+        series=None は全チャンネル（ロールなし）。
+        """
+        out: dict[int, list[int]] = {}
+        for (channel_id, sub_series), sub in self._all().items():
+            if series is None:
+                out.setdefault(channel_id, [])
+                continue
+            if sub_series != ALL_SERIES and sub_series not in series:
+                continue
+            roles = out.setdefault(channel_id, [])
+            if sub.role_id and sub.role_id not in roles:
+                roles.append(sub.role_id)
+        return out
+
+    def __len__(self) -> int:
+        return len(self._all())
+
+    def guild_of(self, channel_id: int) -> int | None:
+        for (sub_channel_id, _), sub in self._subs.items():
+            if sub_channel_id == channel_id and sub.guild_id:
+                return sub.guild_id
+        return None
+
+    def _all(self) -> dict[tuple[int, str], Subscription]:
+        self._reload_if_changed()
+        # 明示的な登録が既定より優先される
+        return {**self._defaults, **self._subs}
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,74 @@
+import time
+
+from records import Contest
+
+
+class ContestTimetable:
+    """
+    開催中・予定されたコンテストのメモリ上の時刻表。
+    /contests/ を読むたびに update() でスラッグ単位の差分だけを反映し、
+    /contests コマンドはここから即答する（コマンドごとの通信はしない）。
+
+    エントリは records.Contest。
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.updated_at = 0.0
+        self._by_slug: dict[str, Contest] = {}
+        self._ordered: list[Contest] = []
+
+    def update(self, contests: list[Contest], now: float | None = None) -> int:
+        """
+        取得した一覧を反映する。追加・変更・削除されたコンテストの数を返す。
+        一覧から消えたものと終了したものは落とす。
+        """
+        now = time.time() if now is None else now
+        changed = 0
+        fresh: dict[str, Contest] = {}
+        for entry in contests:
+            if entry.start + entry.duration < now:
+                continue
+            current = self._by_slug.get(entry.slug)
+            if current == entry:
+                # 変わっていなければ前のレコードを使い続ける
+                entry = current
+            else:
+                changed += 1
+            fresh[entry.slug] = entry
+        changed += len(self._by_slug.keys() - fresh.keys())
+        if changed:
+            self._by_slug = fresh
+            self._ordered = sorted(fresh.values(), key=lambda e: e.start)
+        self.ready = True
+        self.updated_at = now
+        return changed
+
+    def get(self, slug: str) -> Contest | None:
+        return self._by_slug.get(slug)
+
+    def contests(self) -> list[Contest]:
+        return list(self._ordered)
+
+    def snapshot(self) -> list[dict]:
+        """kv に保存する形（restore() で戻す）。"""
+        return [entry.to_dict() for entry in self._ordered]
+
+    def restore(self, snapshot: list[dict], now: float | None = None) -> int:
+        return self.update([Contest.from_dict(c) for c in snapshot], now)
+
+    def upcoming(
+        self, series: str | None = None, limit: int = 10, now: float | None = None
+    ) -> list[Contest]:
+        """終了していないコンテストを開始順に返す。series を指定すればそのシリーズだけ。"""
+        now = time.time() if now is None else now
+        out = []
+        for entry in self._ordered:
+            if entry.start + entry.duration < now:
+                continue
+            if series and entry.series != series:
+                continue
+            out.append(entry)
+            if len(out) >= limit:
+                break
+        return out